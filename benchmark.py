@@ -0,0 +1,537 @@
+#!/usr/bin/env python3
+
+"""
+Generate synthetic opendata snapshots, and time the stages of wrangle.py on
+them.
+
+    ./benchmark.py generate /tmp/synthetic.zip --entries 100000
+    ./benchmark.py run /tmp/synthetic.zip --save-baseline /tmp/baseline.json
+    ./benchmark.py run /tmp/synthetic.zip --baseline /tmp/baseline.json
+
+The synthetic entries are copies of the ones in example-entries.py, with
+device names, scenes and render times replaced.
+"""
+
+import gc
+import io
+import os
+import ast
+import sys
+import copy
+import json
+import time
+import random
+import zipfile
+import argparse
+import tracemalloc
+import contextlib
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+import wrangle
+
+EXAMPLE_ENTRIES_FILENAME = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "example-entries.py"
+)
+
+SCHEMA_VERSIONS = ["v1", "v2", "v3", "v4"]
+
+# Device names to generate, spelled in some of the different ways the real
+# database spells them
+GPU_NAME_FORMATS = [
+    "NVIDIA GeForce RTX {model}",
+    "GeForce RTX {model}",
+    "NVIDIA GeForce GTX {model}",
+    "AMD Radeon Pro {model}M",
+    "Radeon RX {model}",
+]
+CPU_NAME_FORMATS = [
+    "Intel(R) Core(TM) i7-{model}HQ CPU @ 2.30GHz",
+    "Intel Core i9-{model}K CPU @ 3.60GHz",
+    "AMD Ryzen 9 {model}X 16-Core Processor",
+    "Apple M{model}",
+]
+GPU_DEVICE_TYPES = ["CUDA", "OPTIX", "HIP", "METAL", "OPENCL"]
+
+# Every this many render results fail, and get no timing in v1 and v2 entries
+FAILED_SCENE_INTERVAL = 50
+
+
+def load_example_entries() -> Dict[str, Dict]:
+    """
+    Map schema versions to their example entry from example-entries.py.
+    """
+    with open(EXAMPLE_ENTRIES_FILENAME, encoding="utf-8") as source:
+        module = ast.parse(source.read())
+
+    # The file is a docstring followed by a list of entries
+    for statement in module.body:
+        if isinstance(statement, ast.Expr) and isinstance(statement.value, ast.List):
+            entries = ast.literal_eval(statement.value)
+            break
+    else:
+        sys.exit(f"No list of entries found in {EXAMPLE_ENTRIES_FILENAME}")
+
+    examples = {entry["schema_version"]: entry for entry in entries}
+    if "v4" not in examples:
+        # Same shape as v3, see wrangle.process_opendata()
+        examples["v4"] = dict(copy.deepcopy(examples["v3"]), schema_version="v4")
+    return examples
+
+
+def get_example_scenes(examples: Dict[str, Dict]) -> List[str]:
+    scenes: List[str] = []
+    for entry in examples.values():
+        if isinstance(entry["data"], list):
+            names = [data["scene"]["label"] for data in entry["data"]]
+        else:
+            names = [scene["name"] for scene in entry["data"]["scenes"]]
+        for name in names:
+            if name not in scenes:
+                scenes.append(name)
+    return scenes
+
+
+class SyntheticDevice(NamedTuple):
+    name: str
+    device_type: str
+    threads: int
+
+    # Render time multiplier, lower is faster
+    slowness: float
+
+    scenes: List[str]
+
+
+def make_devices(
+    rng: random.Random, device_count: int, scenes: List[str], coverage: float
+) -> List[SyntheticDevice]:
+    """
+    Make up device_count devices, each having rendered about coverage of the
+    scenes.
+    """
+    devices: List[SyntheticDevice] = []
+    for index in range(device_count):
+        if index % 2:
+            name_format = CPU_NAME_FORMATS[index // 2 % len(CPU_NAME_FORMATS)]
+            device_type = "CPU"
+            threads = rng.choice([4, 8, 12, 16, 24, 32, 64])
+        else:
+            name_format = GPU_NAME_FORMATS[index // 2 % len(GPU_NAME_FORMATS)]
+            device_type = rng.choice(GPU_DEVICE_TYPES)
+            threads = rng.choice([4, 8, 12, 16])
+        name = name_format.format(model=1000 + index)
+
+        scene_count = max(1, min(len(scenes), round(coverage * len(scenes))))
+        devices.append(
+            SyntheticDevice(
+                name=name,
+                device_type=device_type,
+                threads=threads,
+                slowness=rng.lognormvariate(0, 1),
+                scenes=rng.sample(scenes, scene_count),
+            )
+        )
+    return devices
+
+
+def make_entry(
+    rng: random.Random,
+    example: Dict,
+    entry_id: int,
+    device: SyntheticDevice,
+    scene_times: Dict[str, float],
+) -> Dict:
+    entry = copy.deepcopy(example)
+    entry["id"] = f"synthetic-{entry_id}"
+    entry["created_at"] = time.strftime(
+        "%Y-%m-%dT%H:%M:%S+00:00", time.gmtime(1_500_000_000 + entry_id * 60)
+    )
+
+    scenes = rng.sample(device.scenes, rng.randint(1, len(device.scenes)))
+
+    def render_time(scene: str) -> float:
+        return round(scene_times[scene] * device.slowness * rng.uniform(1.0, 1.3), 3)
+
+    if entry["schema_version"] in ("v1", "v2"):
+        data = entry["data"]
+        if entry["schema_version"] == "v1":
+            data["device_info"]["compute_devices"] = [device.name]
+        else:
+            data["device_info"]["compute_devices"] = [{"name": device.name}]
+        data["device_info"]["device_type"] = device.device_type
+        data["device_info"]["num_cpu_threads"] = device.threads
+
+        template = data["scenes"][0]
+        data["scenes"] = []
+        for scene in scenes:
+            result = copy.deepcopy(template)
+            result["name"] = scene
+            result["stats"]["total_render_time"] = render_time(scene)
+            result["stats"]["result"] = "OK"
+            if rng.randrange(FAILED_SCENE_INTERVAL) == 0:
+                result["stats"] = {"result": "CRASH"}
+            data["scenes"].append(result)
+        return entry
+
+    template = entry["data"][0]
+    entry["data"] = []
+    for scene in scenes:
+        data = copy.deepcopy(template)
+        compute_devices = [{"name": device.name, "type": device.device_type}]
+        data["device_info"]["compute_devices"] = compute_devices
+        data["device_info"]["device_type"] = device.device_type
+        data["device_info"]["num_cpu_threads"] = device.threads
+        data["system_info"]["devices"] = compute_devices
+        data["scene"]["label"] = scene
+        data["stats"]["total_render_time"] = render_time(scene)
+        entry["data"].append(data)
+    return entry
+
+
+def generate_snapshot(
+    filename: str,
+    entry_count: int,
+    device_count: int,
+    scene_count: int,
+    coverage: float,
+    schema_versions: List[str],
+    seed: int,
+) -> None:
+    """
+    Write a zipped JSONL snapshot of entry_count entries to filename.
+
+    Scenes are the ones from example-entries.py, plus made up ones if
+    scene_count asks for more than that.
+    """
+    rng = random.Random(seed)
+    examples = load_example_entries()
+
+    scenes = get_example_scenes(examples)
+    while len(scenes) < scene_count:
+        scenes.append(f"synthetic_scene_{len(scenes)}")
+    scenes = scenes[:scene_count]
+    scene_times = {scene: rng.uniform(30, 1500) for scene in scenes}
+
+    devices = make_devices(rng, device_count, scenes, coverage)
+
+    # A fixed timestamp makes the same seed give the same zip file
+    member = zipfile.ZipInfo(
+        os.path.splitext(os.path.basename(filename))[0] + ".jsonl",
+        date_time=(2020, 1, 1, 0, 0, 0),
+    )
+    member.compress_type = zipfile.ZIP_DEFLATED
+    with zipfile.ZipFile(filename, "w") as snapshot:
+        with snapshot.open(member, "w") as jsonl:
+            for entry_id in range(entry_count):
+                example = examples[rng.choice(schema_versions)]
+                device = rng.choice(devices)
+                entry = make_entry(rng, example, entry_id, device, scene_times)
+                jsonl.write(json.dumps(entry).encode("utf-8") + b"\n")
+
+    size_mb = os.path.getsize(filename) / (1024 * 1024)
+    print(f"Wrote {entry_count} entries to {filename} ({size_mb:.1f}MB)")
+
+
+class StageResult(NamedTuple):
+    seconds: float
+
+    # What the stage processed, for computing throughput
+    items: float
+    unit: str
+
+    # Peak traced memory, None if not tracing
+    peak_mb: Optional[float]
+
+
+class Stopwatch:
+    """
+    Times stages, and optionally traces their peak memory usage.
+    """
+
+    def __init__(self, trace_memory: bool) -> None:
+        self.trace_memory = trace_memory
+        self.results: Dict[str, StageResult] = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str, unit: str) -> Iterator[List[float]]:
+        """
+        Time the body of a with statement. The body should append the number of
+        processed items to the yielded list.
+        """
+        items: List[float] = []
+        if self.trace_memory:
+            tracemalloc.start()
+
+        # Stages print things through wrangle, keep that out of our report
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            yield items
+            seconds = time.perf_counter() - start
+
+        peak_mb: Optional[float] = None
+        if self.trace_memory:
+            peak_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            tracemalloc.stop()
+        self.results[name] = StageResult(seconds, sum(items), unit, peak_mb)
+
+
+def run_stages(
+    zip_filename: str,
+    device_patterns: List[str],
+    json_backend: str,
+    scorer: str,
+    trace_memory: bool,
+) -> Dict[str, StageResult]:
+    stopwatch = Stopwatch(trace_memory)
+
+    with stopwatch.stage("zip read", "MB") as items:
+        with zipfile.ZipFile(zip_filename) as opendata:
+            blobs = [
+                opendata.read(entry)
+                for entry in opendata.infolist()
+                if entry.filename.endswith(".jsonl")
+            ]
+        lines = [line for blob in blobs for line in blob.splitlines() if line.strip()]
+        items.append(sum(len(blob) for blob in blobs) / (1024 * 1024))
+    del blobs
+
+    with stopwatch.stage("decode", "lines") as items:
+        # wrangle.py drops each entry right after processing it. Keeping them
+        # all alive here would make the garbage collector rescan them over and
+        # over, which wrangle.py never pays for.
+        gc.disable()
+        try:
+            decode_entry = wrangle.get_json_decoder(json_backend)
+            entries = [decode_entry(line) for line in lines]
+        finally:
+            gc.enable()
+        items.append(len(entries))
+    del lines
+
+    with stopwatch.stage("process_entry", "entries") as items:
+        table = wrangle.SampleTable()
+        for entry in entries:
+            wrangle.process_entry(entry, table)
+        items.append(len(entries))
+    del entries
+
+    with stopwatch.stage("filter", "samples") as items:
+        device_matcher = wrangle.DeviceMatcher(device_patterns)
+        device_codes = table.get_device_codes(device_matcher)
+        items.append(len(table))
+
+    with stopwatch.stage("normalize", "device names") as items:
+        registry = wrangle.DeviceRegistry()
+        for code in set(table.device_name):
+            registry.canonical_name(table.strings[code])
+        items.append(len(registry.canonical_names))
+
+    with stopwatch.stage("aggregate", "samples") as items:
+        devices_to_fastest_per_scene = wrangle.get_fastest_per_scene(
+            table, device_codes, registry
+        )
+        items.append(len(table))
+
+    with stopwatch.stage("censor", "devices") as items:
+        items.append(len(devices_to_fastest_per_scene))
+        wrangle.censor_uncommon_devices(
+            devices_to_fastest_per_scene, wrangle.MIN_COMMON_SCENES_COUNT
+        )
+
+    with stopwatch.stage("score", "devices") as items:
+        common_scenes = set(wrangle.get_all_scenes(devices_to_fastest_per_scene))
+        for timings in devices_to_fastest_per_scene.values():
+            common_scenes.intersection_update(timings.keys())
+        if common_scenes:
+            log_times = wrangle.get_log_times(
+                devices_to_fastest_per_scene, sorted(common_scenes)
+            )
+            wrangle.SCORERS[scorer](log_times)
+        items.append(len(devices_to_fastest_per_scene))
+
+    return stopwatch.results
+
+
+def format_throughput(result: StageResult) -> str:
+    if result.seconds <= 0:
+        return "-"
+    return f"{result.items / result.seconds:,.0f} {result.unit}/s"
+
+
+def print_report(
+    results: Dict[str, StageResult], baseline: Optional[Dict[str, Any]]
+) -> None:
+    header = f"{'Stage':<14} {'Seconds':>8} {'Throughput':>28} {'Peak MB':>8}"
+    if baseline is not None:
+        header += f" {'Baseline':>9} {'Change':>8}"
+    print(header)
+
+    total_seconds = 0.0
+    for name, result in results.items():
+        total_seconds += result.seconds
+        peak = "-" if result.peak_mb is None else f"{result.peak_mb:.1f}"
+        line = f"{name:<14} {result.seconds:8.3f} {format_throughput(result):>28} {peak:>8}"
+        if baseline is not None:
+            line += format_change(result.seconds, baseline["stages"].get(name))
+        print(line)
+
+    line = f"{'total':<14} {total_seconds:8.3f} {'':>28} {'':>8}"
+    if baseline is not None:
+        baseline_total = sum(stage["seconds"] for stage in baseline["stages"].values())
+        line += format_change(total_seconds, {"seconds": baseline_total})
+    print(line)
+
+
+def format_change(seconds: float, baseline_stage: Optional[Dict[str, Any]]) -> str:
+    if not baseline_stage or baseline_stage["seconds"] <= 0:
+        return f" {'-':>9} {'-':>8}"
+    baseline_seconds = baseline_stage["seconds"]
+    change = (seconds - baseline_seconds) / baseline_seconds
+    return f" {baseline_seconds:9.3f} {change:+8.1%}"
+
+
+def run_benchmark(args: argparse.Namespace) -> None:
+    baseline: Optional[Dict[str, Any]] = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+
+    print(
+        f"Benchmarking {args.snapshot} using {args.json_backend}, best of {args.repeat}"
+    )
+
+    # Keep the fastest run of each stage, to reduce noise
+    best: Dict[str, StageResult] = {}
+    for _ in range(args.repeat):
+        results = run_stages(
+            args.snapshot,
+            args.device or wrangle.DEVICE_NAMES,
+            args.json_backend,
+            args.scorer,
+            args.trace_memory,
+        )
+        for name, result in results.items():
+            if name not in best or result.seconds < best[name].seconds:
+                best[name] = result
+
+    print_report(best, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as baseline_file:
+            json.dump(
+                {
+                    "snapshot": args.snapshot,
+                    "json_backend": args.json_backend,
+                    "stages": {name: result._asdict() for name, result in best.items()},
+                },
+                baseline_file,
+                indent=2,
+            )
+        print(f"Saved baseline to {args.save_baseline}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Generate synthetic opendata snapshots and benchmark wrangle.py on them"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate = subparsers.add_parser("generate", help="write a synthetic snapshot")
+    generate.add_argument("snapshot", help="zip file to write")
+    generate.add_argument(
+        "--entries",
+        type=int,
+        default=100_000,
+        help="number of JSONL lines (default: %(default)s)",
+    )
+    generate.add_argument(
+        "--devices",
+        type=int,
+        default=500,
+        help="number of distinct devices (default: %(default)s)",
+    )
+    generate.add_argument(
+        "--scenes",
+        type=int,
+        default=10,
+        help="number of distinct scenes (default: %(default)s)",
+    )
+    generate.add_argument(
+        "--coverage",
+        type=float,
+        default=0.7,
+        help="fraction of the scenes each device has rendered (default: %(default)s)",
+    )
+    generate.add_argument(
+        "--schemas",
+        nargs="+",
+        choices=SCHEMA_VERSIONS,
+        default=SCHEMA_VERSIONS,
+        help="schema versions to generate entries for (default: all)",
+    )
+    generate.add_argument("--seed", type=int, default=0)
+
+    run = subparsers.add_parser("run", help="time each stage on a snapshot")
+    run.add_argument("snapshot", help="zip file to benchmark on")
+    run.add_argument(
+        "--repeat",
+        type=int,
+        default=1,
+        help="run this many times and report the fastest time for each stage (default: %(default)s)",
+    )
+    run.add_argument(
+        "--json-backend",
+        choices=wrangle.JSON_BACKENDS,
+        default=wrangle.JSON_BACKENDS[0],
+        help="(default: %(default)s)",
+    )
+    run.add_argument(
+        "--scorer",
+        choices=list(wrangle.SCORERS.keys()),
+        default="geometric-mean",
+        help="(default: %(default)s)",
+    )
+    run.add_argument(
+        "-d",
+        "--device",
+        action="append",
+        metavar="PATTERN",
+        help="device pattern to filter on, as for wrangle.py (default: DEVICE_NAMES)",
+    )
+    run.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="report peak memory per stage using tracemalloc, this makes all stages slower",
+    )
+    run.add_argument("--baseline", help="compare timings to this saved baseline")
+    run.add_argument("--save-baseline", metavar="FILE", help="save timings to FILE")
+
+    args = parser.parse_args()
+    if args.command == "generate":
+        if args.entries < 1 or args.devices < 1 or args.scenes < 1:
+            parser.error("--entries, --devices and --scenes must be at least 1")
+        if not 0 < args.coverage <= 1:
+            parser.error("--coverage must be more than 0 and at most 1")
+    elif args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+    return args
+
+
+def main() -> None:
+    args = parse_args()
+    if args.command == "generate":
+        generate_snapshot(
+            args.snapshot,
+            entry_count=args.entries,
+            device_count=args.devices,
+            scene_count=args.scenes,
+            coverage=args.coverage,
+            schema_versions=args.schemas,
+            seed=args.seed,
+        )
+    else:
+        run_benchmark(args)
+
+
+if __name__ == "__main__":
+    main()
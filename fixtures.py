@@ -0,0 +1,92 @@
+"""
+Helpers shared by the tests, for building small opendata databases.
+"""
+
+import os
+import json
+import random
+import shutil
+import zipfile
+import tempfile
+import unittest
+
+from typing import Dict, Iterable, List
+
+
+def make_entry(
+    device_name: str,
+    render_time: float,
+    scene: str = "bmw27",
+    os_name: str = "Linux",
+    blender_version: str = "3.6.0",
+    device_type: str = "CUDA",
+) -> Dict:
+    """
+    A v4 opendata entry with one sample.
+    """
+    return {
+        "schema_version": "v4",
+        "data": [
+            {
+                "blender_version": {"version": blender_version},
+                "system_info": {"system": os_name, "devices": []},
+                "device_info": {
+                    "compute_devices": [{"name": device_name, "type": device_type}],
+                    "num_cpu_threads": 8,
+                },
+                "scene": {"label": scene},
+                "stats": {"result": "OK", "total_render_time": render_time},
+            }
+        ],
+    }
+
+
+def make_entries(count: int, seed: int = 0) -> List[Dict]:
+    """
+    count entries for a handful of devices, scenes and environments, with
+    random render times.
+    """
+    random_generator = random.Random(seed)
+    return [
+        make_entry(
+            random_generator.choice(
+                [
+                    "NVIDIA GeForce RTX 4090",
+                    "NVIDIA GeForce RTX 3090",
+                    "GeForce RTX 3090",
+                    "AMD Radeon RX 7900 XTX",
+                    "Intel(R) Core(TM) i7-8700K CPU",
+                ]
+            ),
+            random_generator.uniform(1.0, 300.0),
+            random_generator.choice(["bmw27", "classroom", "fishy_cat", "koro"]),
+            random_generator.choice(["Linux", "Windows", "Darwin"]),
+            random_generator.choice(["3.6.0", "4.0.0"]),
+        )
+        for _ in range(count)
+    ]
+
+
+def write_database(filename: str, entries: Iterable[Dict]) -> None:
+    """
+    Write entries into a zipped JSONL database, like opendata-latest.zip.
+    """
+    with zipfile.ZipFile(filename, "w") as opendata:
+        opendata.writestr(
+            "opendata-latest.jsonl",
+            "".join(json.dumps(entry) + "\n" for entry in entries),
+        )
+
+
+class DatabaseTestCase(unittest.TestCase):
+    """
+    Gives each test its own directory, with self.filename for the database.
+    """
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.filename = os.path.join(self.directory, "opendata-latest.zip")
+
+    def write_database(self, entries: Iterable[Dict]) -> None:
+        write_database(self.filename, entries)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+"""
+Tests for selecting devices, with the different spellings a device has in the
+database.
+
+Run with: python3 -m unittest test_devices
+"""
+
+import io
+import unittest
+import contextlib
+
+from typing import Dict, List, Tuple
+
+import wrangle
+from fixtures import DatabaseTestCase, make_entry
+
+
+class DeviceSpellingTest(DatabaseTestCase):
+    def write_samples(self, samples: List[Tuple[str, float]]) -> None:
+        self.write_database(make_entry(*sample) for sample in samples)
+
+    def get_fastest(self, patterns: List[str], use_cache: bool) -> Dict[str, float]:
+        device_matcher = wrangle.DeviceMatcher(patterns)
+        with contextlib.redirect_stdout(io.StringIO()):
+            table = wrangle.load_samples(
+                self.filename, device_matcher=device_matcher, use_cache=use_cache
+            )
+            devices = wrangle.aggregate(table, device_filter=device_matcher)
+        return {
+            device.name: fastest_per_scene["bmw27"]
+            for device, fastest_per_scene in devices.items()
+        }
+
+    def test_alias_spelling_is_included(self) -> None:
+        self.write_samples(
+            [("NVIDIA GeForce RTX 3080", 20.0), ("GeForce RTX 3080", 10.0)]
+        )
+        for use_cache in (True, False):
+            with self.subTest(use_cache=use_cache):
+                self.assertEqual(
+                    self.get_fastest(["NVIDIA GeForce RTX 3080"], use_cache),
+                    {"NVIDIA GeForce RTX 3080": 10.0},
+                )
+
+    def test_trademarks_are_ignored(self) -> None:
+        self.write_samples(
+            [
+                ("Intel(R) Core(TM) i7-8700K CPU", 30.0),
+                ("Intel Core i7-8700K  CPU", 25.0),
+                ("Intel Core i5-8400 CPU", 40.0),
+            ]
+        )
+        for use_cache in (True, False):
+            with self.subTest(use_cache=use_cache):
+                self.assertEqual(
+                    self.get_fastest(["Core i7-8700K CPU"], use_cache),
+                    {"Intel Core i7-8700K CPU": 25.0},
+                )
+
+    def test_excluded_alias_spelling(self) -> None:
+        self.write_samples(
+            [("NVIDIA GeForce RTX 3080", 20.0), ("GeForce RTX 3080", 10.0)]
+        )
+        for use_cache in (True, False):
+            with self.subTest(use_cache=use_cache):
+                self.assertEqual(
+                    self.get_fastest(["RTX", "!NVIDIA GeForce"], use_cache), {}
+                )
+
+    def test_cached_samples_are_filtered(self) -> None:
+        self.write_samples(
+            [("NVIDIA GeForce RTX 3080", 20.0), ("Intel Core i5-8400 CPU", 40.0)]
+        )
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            for _ in range(2):  # Building the cache, then reading it
+                table = wrangle.load_samples(
+                    self.filename, device_matcher=wrangle.DeviceMatcher(["RTX"])
+                )
+                self.assertEqual(
+                    {table.strings[code] for code in table.device_name},
+                    {"NVIDIA GeForce RTX 3080"},
+                )
+        self.assertEqual(output.getvalue(), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+
+"""
+Tests for downloading the database, against a local http.server stand-in for
+opendata.blender.org.
+
+Run with: python3 -m unittest test_download
+"""
+
+import io
+import os
+import hashlib
+import zipfile
+import threading
+import unittest
+import contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from typing import Dict, List, Optional
+
+import wrangle
+from fixtures import DatabaseTestCase
+
+
+def make_zip(content: bytes) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as opendata:
+        opendata.writestr("opendata-latest.jsonl", content)
+    return buffer.getvalue()
+
+
+class FakeServer:
+    """
+    Serves body with an ETag, honoring If-None-Match and If-Range ranges.
+
+    If truncate_at is set, the next response claims the full length but the
+    connection is closed after that many bytes of the body.
+    """
+
+    def __init__(self) -> None:
+        self.body = make_zip(b"{}\n")
+        self.truncate_at: Optional[int] = None
+        self.requests: List[Dict[str, str]] = []
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                server.requests.append(dict(self.headers))
+                etag = f'"{hashlib.sha256(server.body).hexdigest()[:16]}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+
+                start = 0
+                range_header = self.headers.get("Range")
+                if range_header and self.headers.get("If-Range") == etag:
+                    start = int(range_header[len("bytes=") : -len("-")])
+                body = server.body[start:]
+
+                self.send_response(206 if start else 200)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if server.truncate_at is not None:
+                    body = body[: server.truncate_at]
+                    server.truncate_at = None
+                    self.close_connection = True
+                self.wfile.write(body)
+
+            def log_message(self, *args: object) -> None:
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/opendata-latest.zip"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class DownloadTest(DatabaseTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.server = FakeServer()
+        self.addCleanup(self.server.close)
+
+    def get_zipfile_name(
+        self, filename: Optional[str] = None, expected_sha256: Optional[str] = None
+    ) -> str:
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(
+            io.StringIO()
+        ):
+            return wrangle.get_zipfile_name(
+                self.server.url,
+                max_age_hours=0.0,
+                expected_sha256=expected_sha256,
+                filename=filename or self.filename,
+            )
+
+    def read(self, filename: Optional[str] = None) -> bytes:
+        with open(filename or self.filename, "rb") as database:
+            return database.read()
+
+    def test_download_then_not_modified(self) -> None:
+        self.assertEqual(self.get_zipfile_name(), self.filename)
+        self.assertEqual(self.read(), self.server.body)
+        self.assertTrue(os.path.exists(self.filename + wrangle.DOWNLOAD_STATE_SUFFIX))
+
+        self.get_zipfile_name()
+        self.assertIn("If-None-Match", self.server.requests[-1])
+        self.assertEqual(self.read(), self.server.body)
+
+    def test_newer_database_replaces_ours(self) -> None:
+        self.get_zipfile_name()
+        self.server.body = make_zip(b'{"newer": true}\n')
+        self.get_zipfile_name()
+        self.assertEqual(self.read(), self.server.body)
+
+    def test_interrupted_download_is_resumed(self) -> None:
+        self.server.body = make_zip(os.urandom(100_000))
+        self.server.truncate_at = 30_000
+        with self.assertRaises(wrangle.DownloadError):
+            self.get_zipfile_name()
+        self.assertFalse(os.path.exists(self.filename))
+
+        self.get_zipfile_name()
+        self.assertEqual(self.server.requests[-1]["Range"], "bytes=30000-")
+        self.assertEqual(self.read(), self.server.body)
+
+    def test_interrupted_refresh_keeps_our_database(self) -> None:
+        self.get_zipfile_name()
+        ours = self.read()
+
+        self.server.body = make_zip(os.urandom(100_000))
+        self.server.truncate_at = 30_000
+        self.assertEqual(self.get_zipfile_name(), self.filename)
+        self.assertEqual(self.read(), ours)
+
+    def test_checksum_mismatch(self) -> None:
+        with self.assertRaises(wrangle.DownloadError):
+            self.get_zipfile_name(expected_sha256="0" * 64)
+        self.assertFalse(os.path.exists(self.filename))
+
+        sha256 = hashlib.sha256(self.server.body).hexdigest()
+        self.get_zipfile_name(expected_sha256=sha256)
+        self.assertEqual(self.read(), self.server.body)
+
+    def test_not_a_zip_file(self) -> None:
+        self.server.body = b"<html>Maintenance</html>"
+        with self.assertRaises(wrangle.DownloadError):
+            self.get_zipfile_name()
+        self.assertFalse(os.path.exists(self.filename))
+
+    def test_download_state_per_file(self) -> None:
+        other_filename = os.path.join(self.directory, "other.zip")
+        self.get_zipfile_name()
+        self.get_zipfile_name(other_filename)
+
+        # Knowing about the first file must not make the second one look
+        # current, or resume one with the other's partial download
+        self.assertNotIn("If-None-Match", self.server.requests[1])
+        self.assertNotIn("Range", self.server.requests[1])
+        self.assertTrue(os.path.exists(other_filename + wrangle.DOWNLOAD_STATE_SUFFIX))
+        self.assertEqual(self.read(other_filename), self.server.body)
+
+    def test_quiet_when_recent(self) -> None:
+        self.get_zipfile_name()
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            wrangle.get_zipfile_name(
+                self.server.url, filename=self.filename, quiet=True
+            )
+        self.assertEqual(output.getvalue(), "")
+        self.assertEqual(len(self.server.requests), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+"""
+Tests for aggregating a database in byte ranges and merging the results.
+
+Run with: python3 -m unittest test_mapreduce
+"""
+
+import os
+import random
+import zipfile
+import unittest
+
+import wrangle
+from fixtures import DatabaseTestCase, make_entries
+
+
+class PartialAggregateTest(DatabaseTestCase):
+    def test_same_as_single_pass(self) -> None:
+        self.write_database(make_entries(1000))
+        with zipfile.ZipFile(self.filename) as opendata:
+            size = opendata.infolist()[0].file_size
+        table = wrangle.load_samples(self.filename, use_cache=False)
+
+        # Shards cut in the middle of lines, merged in whatever order
+        random_generator = random.Random(0)
+        cuts = sorted(random_generator.sample(range(1, size), 4))
+        byte_ranges = list(zip([0] + cuts, cuts + [None]))
+        random_generator.shuffle(byte_ranges)
+
+        for aggregator in wrangle.AGGREGATORS:
+            with self.subTest(aggregator=aggregator):
+                partials = []
+                for index, (start, end) in enumerate(byte_ranges):
+                    # Through a file, like separate --map runs would
+                    partial_filename = os.path.join(self.directory, f"{index}.json")
+                    wrangle.map_byte_range(
+                        self.filename, start, end, aggregator=aggregator
+                    ).write(partial_filename)
+                    partials.append(wrangle.PartialAggregate.read(partial_filename))
+                merged = wrangle.reduce_partials(partials)
+
+                self.assertEqual(merged.line_count, 1000)
+                self.assertEqual(merged.sample_count, len(table))
+                single_pass = wrangle.aggregate(table, aggregator=aggregator)
+                self.assertEqual(
+                    list(merged.get_fastest_per_scene().items()),
+                    list(single_pass.items()),
+                )
+
+    def test_unreadable_partials(self) -> None:
+        broken_filename = os.path.join(self.directory, "broken.json")
+        for content in ("{", '{"format": "%s"}' % wrangle.PARTIAL_AGGREGATE_FORMAT):
+            with self.subTest(content=content):
+                with open(broken_filename, "w") as broken_file:
+                    broken_file.write(content)
+                with self.assertRaises(wrangle.DatabaseError):
+                    wrangle.PartialAggregate.read(broken_filename)
+
+        with self.assertRaises(wrangle.DatabaseError):
+            wrangle.PartialAggregate.read(os.path.join(self.directory, "missing.json"))
+
+
+if __name__ == "__main__":
+    unittest.main()
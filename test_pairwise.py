@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+"""
+Tests for ranking devices by head-to-head comparisons.
+
+Run with: python3 -m unittest test_pairwise
+"""
+
+import math
+import random
+import unittest
+
+from typing import Dict
+
+import wrangle
+
+
+def make_chain(
+    device_count: int, log_gap: float, seed: int = 0
+) -> Dict[wrangle.Device, Dict[str, float]]:
+    """
+    Devices that each share one scene with the next one, which is exp(log_gap)
+    times slower. Scenes are randomly harder than others, so that no device's
+    own times tell where it ranks.
+    """
+    random_generator = random.Random(seed)
+    scene_log_times = [
+        random_generator.uniform(0.0, 3.0) for _ in range(device_count + 1)
+    ]
+    return {
+        wrangle.Device.get(f"Test Device {index}", 0): {
+            f"scene {scene}": math.exp(log_gap * index + scene_log_times[scene])
+            for scene in (index, index + 1)
+        }
+        for index in range(device_count)
+    }
+
+
+class PairwiseTest(unittest.TestCase):
+    def test_long_chain(self) -> None:
+        ranking = wrangle.rank_pairwise(make_chain(300, 0.99))
+        self.assertEqual(len(ranking.devices), 300)
+        self.assertEqual(ranking.devices[-1].name, "Test Device 299")
+        self.assertAlmostEqual(
+            math.log(ranking.scores[ranking.devices[-1]]), 299 * 0.99, places=6
+        )
+
+        # Too big to print, so only computed when asked for
+        self.assertIsNone(ranking.log_ratios)
+        self.assertIsNone(ranking.shared_counts)
+
+    def test_matrix_on_request(self) -> None:
+        devices_to_fastest_per_scene = make_chain(300, 0.1)
+        ranking = wrangle.rank_pairwise(devices_to_fastest_per_scene)
+        log_ratios, shared_counts = wrangle.get_pairwise_matrix(
+            ranking, devices_to_fastest_per_scene
+        )
+        self.assertEqual(len(log_ratios), 300)
+        self.assertAlmostEqual(log_ratios[10][11], -0.1)
+        self.assertAlmostEqual(log_ratios[11][10], 0.1)
+        self.assertEqual(shared_counts[10][11], 1)
+        self.assertEqual(shared_counts[10][10], 2)
+        self.assertEqual(log_ratios[10][10], 0.0)
+        self.assertEqual(shared_counts[10][12], 0)
+        self.assertTrue(math.isnan(log_ratios[10][12]))
+
+    def test_ratio_matrix(self) -> None:
+        ranking = wrangle.rank_pairwise(make_chain(5, 0.5))
+        assert ranking.log_ratios is not None and ranking.shared_counts is not None
+        self.assertEqual(len(ranking.log_ratios), 5)
+        self.assertAlmostEqual(ranking.log_ratios[0][1], -0.5)
+        self.assertEqual(ranking.shared_counts[0][1], 1)
+        self.assertTrue(math.isnan(ranking.log_ratios[0][2]))
+
+
+if __name__ == "__main__":
+    unittest.main()
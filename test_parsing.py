@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+"""
+Tests for parsing databases into samples.
+
+Run with: python3 -m unittest test_parsing
+"""
+
+import io
+import json
+import threading
+import unittest
+from unittest import mock
+
+from typing import List, Tuple
+
+import wrangle
+from fixtures import DatabaseTestCase, make_entries, make_entry
+
+
+def get_rows(table: wrangle.SampleTable) -> List[Tuple]:
+    return list(zip(*table.columns()))
+
+
+class ParallelTest(DatabaseTestCase):
+    def test_same_as_serial(self) -> None:
+        self.write_database(make_entries(2000))
+        serial = wrangle.load_samples(self.filename, use_cache=False)
+        self.assertEqual(len(serial), 2000)
+
+        # Small chunks, so that there are many more than processes
+        with mock.patch.object(wrangle, "PARSE_CHUNK_SIZE", 16 * 1024):
+            for pipeline in (False, True):
+                with self.subTest(pipeline=pipeline):
+                    parallel = wrangle.load_samples(
+                        self.filename, jobs=3, use_cache=False, pipeline=pipeline
+                    )
+                    self.assertEqual(parallel.strings, serial.strings)
+                    self.assertEqual(get_rows(parallel), get_rows(serial))
+
+
+class IncrementalTest(DatabaseTestCase):
+    def load(self) -> Tuple[wrangle.SampleTable, List[str]]:
+        messages: List[str] = []
+        table = wrangle.load_samples(self.filename, progress=messages.append)
+        return table, messages
+
+    def assert_same_as_full_parse(self, table: wrangle.SampleTable) -> None:
+        full = wrangle.load_samples(self.filename, use_cache=False)
+        self.assertEqual(table.strings, full.strings)
+        self.assertEqual(get_rows(table), get_rows(full))
+
+    def test_appended_lines(self) -> None:
+        entries = make_entries(600)
+        self.write_database(entries[:400])
+        self.load()
+
+        self.write_database(entries)
+        table, messages = self.load()
+        self.assertIn("added to the", messages[0])
+        self.assertEqual(len(table), 600)
+        self.assert_same_as_full_parse(table)
+
+        # And the cache covers all of it now
+        _, messages = self.load()
+        self.assertEqual(len(messages), 1)
+        self.assertIn("Loaded 600 data points", messages[0])
+
+    def test_changed_prefix(self) -> None:
+        self.write_database(make_entries(400))
+        self.load()
+
+        self.write_database(make_entries(400, seed=1) + make_entries(200))
+        table, messages = self.load()
+        self.assertIn("Database has changed since it was cached", messages)
+        self.assertEqual(len(table), 600)
+        self.assert_same_as_full_parse(table)
+
+
+class PipelineTest(unittest.TestCase):
+    def test_reader_stops_on_error(self) -> None:
+        # An entry that stops parsing, followed by many more blocks than the
+        # reader thread queues up
+        entry = make_entry("NVIDIA GeForce RTX 3080", 20.0)
+        bad_entry = dict(entry, schema_version="v0")
+        lines = [json.dumps(bad_entry)] + [json.dumps(entry)] * 100_000
+        jsonl = io.BytesIO("\n".join(lines).encode())
+
+        # Keeping the error, and the frames in its traceback, must not keep
+        # the reader waiting for the parser
+        try:
+            wrangle.parse_jsonl(
+                jsonl, wrangle.SampleTable(), 1, None, "json", None, pipeline=True
+            )
+        except wrangle.DatabaseError as e:
+            error = e
+        self.assertIsInstance(error, wrangle.DatabaseError)
+        self.assertNotIn(
+            "read-ahead", [thread.name for thread in threading.enumerate()]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+
+"""
+Tests for ranking devices from the samples in a database.
+
+Run with: python3 -m unittest test_ranking
+"""
+
+import random
+import unittest
+import itertools
+from unittest import mock
+
+from typing import Dict, List, Optional, Tuple
+
+import wrangle
+from fixtures import DatabaseTestCase, make_entry
+
+SCENES = ["bmw27", "classroom", "fishy_cat", "koro", "victor"]
+
+
+def make_devices(
+    device_count: int, scene_count: int, seed: int
+) -> Dict[wrangle.Device, Dict[str, float]]:
+    """
+    Devices with timings for random scenes, some scenes more popular than
+    others.
+    """
+    random_generator = random.Random(seed)
+    popularity = [random_generator.uniform(0.3, 1.0) for _ in range(scene_count)]
+    devices: Dict[wrangle.Device, Dict[str, float]] = {}
+    for index in range(device_count):
+        scenes = [
+            f"scene {scene}"
+            for scene in random_generator.sample(range(scene_count), scene_count)
+            if random_generator.random() < popularity[scene]
+        ]
+        devices[wrangle.Device.get(f"Test Device {index}", 0)] = {
+            scene: random_generator.uniform(1.0, 100.0) for scene in scenes
+        }
+    return devices
+
+
+def get_baseline_drops(
+    devices_to_fastest_per_scene: Dict[wrangle.Device, Dict[str, float]],
+    min_count: int,
+) -> Tuple[List[Tuple[wrangle.Device, str]], bool]:
+    """
+    What wrangle.get_greedy_drops() does, recounting all scenes after every
+    drop like censor_uncommon_devices() used to.
+    """
+    remaining = dict(devices_to_fastest_per_scene)
+    drops: List[Tuple[wrangle.Device, str]] = []
+    while len(remaining) > 1:
+        scene_counts = wrangle.get_scene_counts(remaining)
+        common_scenes_count = 0
+        most_common_incomplete_scene: Optional[str] = None
+        most_common_incomplete_count = 0
+        for scene, count in scene_counts.items():
+            if count == len(remaining):
+                common_scenes_count += 1
+                continue
+            # On ties, the last scene wins
+            if count >= most_common_incomplete_count:
+                most_common_incomplete_scene = scene
+                most_common_incomplete_count = count
+        if common_scenes_count >= min_count:
+            return drops, True
+        if most_common_incomplete_scene is None:
+            break
+
+        device = next(
+            device
+            for device, timings in remaining.items()
+            if most_common_incomplete_scene not in timings
+        )
+        drops.append((device, most_common_incomplete_scene))
+        del remaining[device]
+    return drops, False
+
+
+class ZeroRenderTimeTest(DatabaseTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        entries = [
+            make_entry(device_name, render_time, scene)
+            for device_name, render_time in (
+                ("NVIDIA GeForce RTX 4090", 10.0),
+                ("NVIDIA GeForce RTX 3090", 20.0),
+            )
+            for scene in SCENES
+        ]
+        # Some entries claim to have taken no time at all
+        entries.append(make_entry("NVIDIA GeForce RTX 3090", 0.0, "bmw27"))
+        self.write_database(entries)
+
+    def load(self) -> Dict[wrangle.Device, Dict[str, float]]:
+        return wrangle.aggregate(wrangle.load_samples(self.filename))
+
+    def test_zero_is_clamped(self) -> None:
+        for fastest_per_scene in self.load().values():
+            for seconds in fastest_per_scene.values():
+                self.assertGreaterEqual(seconds, wrangle.MIN_RENDER_TIME_SECONDS)
+
+    def test_rank(self) -> None:
+        ranking = wrangle.rank(self.load())
+        self.assertEqual(ranking.common_scenes, SCENES)
+        names: List[str] = [device.name for device in ranking.scores]
+        self.assertEqual(names, ["NVIDIA GeForce RTX 3090", "NVIDIA GeForce RTX 4090"])
+
+    def test_rank_pairwise(self) -> None:
+        ranking = wrangle.rank_pairwise(self.load())
+        names: List[str] = [device.name for device in ranking.devices]
+        self.assertEqual(names, ["NVIDIA GeForce RTX 3090", "NVIDIA GeForce RTX 4090"])
+        assert ranking.shared_counts is not None
+        self.assertEqual(ranking.shared_counts[0][1], len(SCENES))
+
+    def test_bootstrap_ranking(self) -> None:
+        table = wrangle.load_samples(self.filename)
+        ranking = wrangle.rank(wrangle.aggregate(table))
+        confidences = wrangle.bootstrap_ranking(
+            ranking, wrangle.get_samples_per_scene(table), replicates=100, seed=0
+        )
+        self.assertEqual(
+            [confidence.rank for confidence in confidences.values()], [1, 2]
+        )
+        for confidence in confidences.values():
+            self.assertGreater(confidence.low, 0.0)
+
+
+class GreedyDropsTest(unittest.TestCase):
+    def test_same_as_baseline(self) -> None:
+        for seed in range(20):
+            devices = make_devices(60, 12, seed)
+            for min_count in (1, 3, 5, 8, 12):
+                with self.subTest(seed=seed, min_count=min_count):
+                    self.assertEqual(
+                        wrangle.get_greedy_drops(devices, min_count),
+                        get_baseline_drops(devices, min_count),
+                    )
+
+
+class BestSceneSetTest(unittest.TestCase):
+    def test_same_as_brute_force(self) -> None:
+        for seed in range(20):
+            random_generator = random.Random(seed)
+            device_count = 40
+            scene_masks = []
+            for _ in range(12):
+                popularity = random_generator.uniform(0.3, 1.0)
+                scene_masks.append(
+                    sum(
+                        1 << device
+                        for device in range(device_count)
+                        if random_generator.random() < popularity
+                    )
+                )
+            scene_masks.sort(key=wrangle.popcount, reverse=True)
+
+            for min_count in (1, 3, 6):
+                masks = set()
+                for scene_set in itertools.combinations(scene_masks, min_count):
+                    mask = (1 << device_count) - 1
+                    for scene_mask in scene_set:
+                        mask &= scene_mask
+                    masks.add(mask)
+                best_count = max(map(wrangle.popcount, masks))
+
+                # Without much of a beam search to start from, the branch and
+                # bound has to find the best set by itself
+                for beam_width in (1, wrangle.BEAM_SEARCH_WIDTH):
+                    with self.subTest(
+                        seed=seed, min_count=min_count, beam_width=beam_width
+                    ), mock.patch.object(wrangle, "BEAM_SEARCH_WIDTH", beam_width):
+                        mask, exact = wrangle.find_best_scene_set(
+                            scene_masks, min_count, wrangle.OPTIMAL_SEARCH_MAX_NODES
+                        )
+                        self.assertTrue(exact)
+                        self.assertIn(mask, masks)
+                        self.assertEqual(wrangle.popcount(mask), best_count)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+"""
+Tests for answering ranking queries over HTTP.
+
+Run with: python3 -m unittest test_server
+"""
+
+import io
+import json
+import threading
+import unittest
+import contextlib
+from http.server import ThreadingHTTPServer
+from urllib import error, request
+
+from typing import Any, Dict, Tuple
+
+import wrangle
+from fixtures import DatabaseTestCase, make_entry
+
+
+class ServerTest(DatabaseTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.write_database(
+            make_entry(device_name, render_time * speed, scene, os_name)
+            for device_name, speed in (
+                ("NVIDIA GeForce RTX 4090", 1.0),
+                ("NVIDIA GeForce RTX 3090", 2.0),
+                ("NVIDIA GeForce RTX 3060 Laptop GPU", 4.0),
+            )
+            for os_name in ("Linux", "Windows")
+            for scene, render_time in (("bmw27", 10.0), ("classroom", 30.0))
+        )
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            service = wrangle.RankingService(lambda: self.filename)
+        wrangle.RankingRequestHandler.service = service
+        self.httpd = ThreadingHTTPServer(
+            ("127.0.0.1", 0), wrangle.RankingRequestHandler
+        )
+        self.addCleanup(self.httpd.server_close)
+        self.addCleanup(self.httpd.shutdown)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def get(self, path: str) -> Tuple[int, Dict[str, Any]]:
+        url = f"http://127.0.0.1:{self.httpd.server_port}{path}"
+        try:
+            with request.urlopen(url) as response:
+                return response.status, json.load(response)
+        except error.HTTPError as e:
+            return e.code, json.load(e)
+
+    def test_rank(self) -> None:
+        status, response = self.get(
+            "/rank?device=RTX&device=!Laptop&os=Linux&scene=bmw27&min_common_scenes=1"
+        )
+        self.assertEqual(status, 200)
+        self.assertEqual(response["common_scenes"], ["bmw27"])
+        self.assertEqual(
+            [device["name"] for device in response["devices"]],
+            ["NVIDIA GeForce RTX 4090", "NVIDIA GeForce RTX 3090"],
+        )
+
+    def test_unanswerable_queries(self) -> None:
+        for query in (
+            "device=RTX&os=Linux&scene=bmw27",
+            "min_common_scenes=50",
+            "min_common_scenes=50&solver=optimal",
+            "min_common_scenes=0",
+            "min_common_scenes=-3",
+            "min_common_scenes=many",
+            "aggregator=all-samples",
+        ):
+            with self.subTest(query=query):
+                status, response = self.get(f"/rank?{query}")
+                self.assertEqual(status, 400)
+                self.assertIn("error", response)
+
+        # Still serving
+        status, response = self.get("/status")
+        self.assertEqual(status, 200)
+        self.assertEqual(response["data_points"], 12)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,13 +2,74 @@
 
 import os
 import sys
+import time
+import shutil
+import queue
+import hashlib
+import re
 import json
-import pprint
+import math
+import random
+import operator
+import itertools
+import heapq
 import zipfile
+import cProfile
+import argparse
 import traceback
-from urllib import request
+import contextlib
+import tracemalloc
+import statistics
+import collections
+import threading
+import multiprocessing
+from array import array
+from http.client import HTTPException
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib import error, parse, request
 
-from typing import Dict, NamedTuple, List, Iterable, Set, cast
+from typing import (
+    IO,
+    Any,
+    Callable,
+    ClassVar,
+    Pattern,
+    Deque,
+    Dict,
+    Generator,
+    Iterator,
+    NamedTuple,
+    List,
+    Iterable,
+    Optional,
+    Protocol,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+# Not available on Windows, see Profiler
+try:
+    import resource
+
+    HAVE_RESOURCE = True
+except ImportError:
+    HAVE_RESOURCE = False
+
+# Optional faster JSON decoders, see get_json_decoder()
+try:
+    import orjson
+
+    HAVE_ORJSON = True
+except ImportError:
+    HAVE_ORJSON = False
+try:
+    import msgspec
+
+    HAVE_MSGSPEC = True
+except ImportError:
+    HAVE_MSGSPEC = False
 
 # Make a top list out of these
 DEVICE_NAMES: List[str] = [
@@ -25,37 +86,403 @@ MIN_COMMON_SCENES_COUNT = 5
 
 LOCAL_DATABASE_FILENAME = "/tmp/opendata-latest.zip"
 
+DATABASE_URL = "https://opendata.blender.org/snapshots/opendata-latest.zip"
+
+# Ask the server for a newer database when ours was last checked this long ago
+DATABASE_MAX_AGE_HOURS = 24.0
+
+# Next to each downloaded database, we keep track of its ETag, Last-Modified
+# and partial download in a file with this suffix, see download_database()
+DOWNLOAD_STATE_SUFFIX = ".download.json"
+
+# Device names are reported both with and without the vendor name, depending
+# on driver and OS. Lowercase prefix to canonical prefix, see DeviceRegistry.
+DEVICE_VENDOR_PREFIXES: Dict[str, str] = {
+    "geforce ": "NVIDIA GeForce ",
+    "quadro ": "NVIDIA Quadro ",
+    "titan ": "NVIDIA TITAN ",
+    "tesla ": "NVIDIA Tesla ",
+    "radeon ": "AMD Radeon ",
+    "ryzen ": "AMD Ryzen ",
+}
+
+# Available JSON decoders, fastest first. See get_json_decoder(). Decoding
+# itself is about as fast with msgspec as with orjson, but on the samples we
+# tried msgspec came out a bit slower overall.
+JSON_BACKENDS: List[str] = [
+    backend
+    for backend, available in (
+        ("orjson", HAVE_ORJSON),
+        ("msgspec", HAVE_MSGSPEC),
+        ("json", True),
+    )
+    if available
+]
+
+# Parsed samples from a database are cached in the database's file name plus
+# this suffix, see SampleTable.write()
+SAMPLES_CACHE_SUFFIX = ".samples"
+SAMPLES_CACHE_MAGIC = b"opendata-samples v2\n"
+
+# How much decompressed JSONL to hand to each parser process at a time
+PARSE_CHUNK_SIZE = 4 * 1024 * 1024
+
+# With --pipeline, the reader thread inflates the database this much at a time,
+# and stays at most this many batches ahead of the parser
+PIPELINE_BLOCK_SIZE = 1024 * 1024
+PIPELINE_QUEUE_DEPTH = 8
+
+# For --aggregator=top-k, how many of the fastest samples to keep per device
+# and scene. The slowest of those is used, so up to TOP_K_SAMPLES - 1 bogus
+# fast samples are ignored.
+TOP_K_SAMPLES = 3
+
+# Render times get logged all over, so faster ones, like the zero seconds some
+# entries claim, are taken to be this fast when they are parsed
+MIN_RENDER_TIME_SECONDS = 0.001
 
-class Sample(NamedTuple):
-    device_name: str
-    device_type: str
-    device_threads: int
+# For --aggregator=median and p10, the relative error of QuantileSketch, and
+# the range of render times it tells apart
+QUANTILE_SKETCH_ACCURACY = 0.01
+QUANTILE_SKETCH_MIN_SECONDS = MIN_RENDER_TIME_SECONDS
+QUANTILE_SKETCH_MAX_SECONDS = 10_000_000.0
 
+# For --scorer=trimmed-mean, drop this fraction of the fastest and of the
+# slowest scenes of each device
+TRIMMED_MEAN_FRACTION = 0.2
+
+# For --serve, how many query results to keep, and how often to look for a new
+# database snapshot
+QUERY_CACHE_SIZE = 256
+SNAPSHOT_POLL_SECONDS = 60.0
+
+# Limits for --solver=optimal, see find_best_scene_set()
+OPTIMAL_SEARCH_MAX_NODES = 200_000
+BEAM_SEARCH_WIDTH = 64
+
+# For --pairwise, stop refining the estimates once the residual is this small
+# relative to where it started, and give up after this many iterations per
+# device. Bigger matrices than PAIRWISE_MATRIX_MAX_DEVICES aren't printed, or
+# computed unless asked for with get_pairwise_matrix().
+PAIRWISE_TOLERANCE = 1e-12
+PAIRWISE_MAX_ITERATIONS_PER_DEVICE = 10
+PAIRWISE_MATRIX_MAX_DEVICES = 40
+
+# For --confidence, how many resamples to rank. Each resampled aggregate is
+# looked up with this many random bits, which must fit in an "H" array.
+BOOTSTRAP_REPLICATES = 10_000
+BOOTSTRAP_RANDOM_BITS = 16
+
+
+class Environment(NamedTuple):
     blender_version: str
     os_name: str
     scene_name: str
 
-    render_time_seconds: float
+
+class SampleTable:
+    """
+    Samples stored column by column.
+
+    All strings are interned into one shared list, and the string columns hold
+    integer indices into that list. This makes the table compact both in memory
+    and on disk.
+
+    If device_filter is set, samples for devices it doesn't accept are dropped
+    by add(). Render times are at least MIN_RENDER_TIME_SECONDS.
+    """
+
+    strings: List[str]
+    string_codes: Dict[str, int]
+    device_filter: Optional[Callable[[str], bool]]
+
+    def __init__(self, device_filter: Optional[Callable[[str], bool]] = None) -> None:
+        self.strings = []
+        self.string_codes = {}
+        self.device_filter = device_filter
+
+        self.device_name = array("i")
+        self.device_type = array("i")
+        self.device_threads = array("i")
+        self.blender_version = array("i")
+        self.os_name = array("i")
+        self.scene_name = array("i")
+        self.render_time_seconds = array("d")
+
+    def __len__(self) -> int:
+        return len(self.render_time_seconds)
+
+    def columns(self) -> List[array]:
+        return [
+            self.device_name,
+            self.device_type,
+            self.device_threads,
+            self.blender_version,
+            self.os_name,
+            self.scene_name,
+            self.render_time_seconds,
+        ]
+
+    def __getstate__(self) -> Dict:
+        # string_codes can be rebuilt from strings, and the filter has already
+        # done its job, don't pickle those
+        state = dict(self.__dict__)
+        del state["string_codes"]
+        del state["device_filter"]
+        return state
+
+    def __setstate__(self, state: Dict) -> None:
+        self.__dict__.update(state)
+        self.string_codes = {string: code for code, string in enumerate(self.strings)}
+        self.device_filter = None
+
+    def intern(self, string: str) -> int:
+        code = self.string_codes.get(string)
+        if code is None:
+            code = len(self.strings)
+            self.strings.append(string)
+            self.string_codes[string] = code
+        return code
+
+    def add(
+        self,
+        device_name: str,
+        device_type: str,
+        device_threads: int,
+        blender_version: str,
+        os_name: str,
+        scene_name: str,
+        render_time_seconds: float,
+    ) -> None:
+        if self.device_filter is not None and not self.device_filter(device_name):
+            return
+
+        self.device_name.append(self.intern(device_name))
+        self.device_type.append(self.intern(device_type))
+        self.device_threads.append(device_threads)
+        self.blender_version.append(self.intern(blender_version))
+        self.os_name.append(self.intern(os_name))
+        self.scene_name.append(self.intern(scene_name))
+        self.render_time_seconds.append(
+            max(render_time_seconds, MIN_RENDER_TIME_SECONDS)
+        )
+
+    def extend(self, other: "SampleTable") -> None:
+        """
+        Append all samples from other to this table.
+        """
+        codes = array("i", [self.intern(string) for string in other.strings])
+        self.device_name.extend(array("i", [codes[code] for code in other.device_name]))
+        self.device_type.extend(array("i", [codes[code] for code in other.device_type]))
+        self.device_threads.extend(other.device_threads)
+        self.blender_version.extend(
+            array("i", [codes[code] for code in other.blender_version])
+        )
+        self.os_name.extend(array("i", [codes[code] for code in other.os_name]))
+        self.scene_name.extend(array("i", [codes[code] for code in other.scene_name]))
+        self.render_time_seconds.extend(other.render_time_seconds)
+
+    def get_device_codes(self, device_filter: Callable[[str], bool]) -> Set[int]:
+        """
+        Find the codes of all device names accepted by device_filter.
+
+        The filter is called once per distinct device name, not once per sample.
+        """
+        device_codes: Set[int] = set()
+        for code in set(self.device_name):
+            if device_filter(self.strings[code]):
+                device_codes.add(code)
+        return device_codes
+
+    def select_devices(self, device_filter: Callable[[str], bool]) -> "SampleTable":
+        """
+        Return a new table with only the samples for devices accepted by
+        device_filter.
+        """
+        device_codes = self.get_device_codes(device_filter)
+        rows = [row for row, code in enumerate(self.device_name) if code in device_codes]
+        table = SampleTable()
+        table.strings = list(self.strings)
+        table.string_codes = dict(self.string_codes)
+        for column, selected in zip(self.columns(), table.columns()):
+            selected.extend(column[row] for row in rows)
+        return table
+
+    def get_device_rows(self) -> Dict[int, array]:
+        """
+        Map device name codes to the (ascending) indices of their samples.
+        """
+        device_rows: Dict[int, array] = {}
+        for row, code in enumerate(self.device_name):
+            rows = device_rows.get(code)
+            if rows is None:
+                rows = array("i")
+                device_rows[code] = rows
+            rows.append(row)
+        return device_rows
+
+    def get_environment_rows(self) -> Dict[Tuple[int, int, int], array]:
+        """
+        Map the (blender_version, os_name, scene_name) codes of each Environment
+        to the (ascending) indices of its samples.
+        """
+        environment_rows: Dict[Tuple[int, int, int], array] = {}
+        for row, key in enumerate(
+            zip(self.blender_version, self.os_name, self.scene_name)
+        ):
+            rows = environment_rows.get(key)
+            if rows is None:
+                rows = array("i")
+                environment_rows[key] = rows
+            rows.append(row)
+        return environment_rows
+
+    def filter_environments(
+        self, rows: Iterable[int], environment_filter: Callable[[Environment], bool]
+    ) -> List[int]:
+        """
+        Return the rows whose Environment is accepted by environment_filter.
+
+        The filter is called once per distinct Environment, not once per
+        sample.
+        """
+        strings = self.strings
+        verdicts: Dict[Tuple[int, int, int], bool] = {}
+        filtered_rows: List[int] = []
+        for row in rows:
+            key = (self.blender_version[row], self.os_name[row], self.scene_name[row])
+            verdict = verdicts.get(key)
+            if verdict is None:
+                verdict = environment_filter(
+                    Environment(
+                        blender_version=strings[key[0]],
+                        os_name=strings[key[1]],
+                        scene_name=strings[key[2]],
+                    )
+                )
+                verdicts[key] = verdict
+            if verdict:
+                filtered_rows.append(row)
+        return filtered_rows
+
+    def write(self, filename: str, key: Dict, watermark: Optional[Dict] = None) -> None:
+        """
+        Store this table on disk, tagged with key and watermark.
+
+        The file is a magic line, a JSON header line with the key, the watermark
+        and the string table, followed by the raw column arrays.
+        """
+        header = {
+            "key": key,
+            "watermark": watermark,
+            "byteorder": sys.byteorder,
+            "itemsizes": [column.itemsize for column in self.columns()],
+            "rows": len(self),
+            "strings": self.strings,
+        }
+
+        # Write to a temporary file and rename, so that an interrupted write
+        # never leaves a broken cache behind
+        temporary_filename = filename + ".tmp"
+        with open(temporary_filename, "wb") as cache:
+            cache.write(SAMPLES_CACHE_MAGIC)
+            cache.write(json.dumps(header).encode("utf-8") + b"\n")
+            for column in self.columns():
+                column.tofile(cache)
+        os.replace(temporary_filename, filename)
+
+    @classmethod
+    def read(cls, filename: str) -> Optional[Tuple["SampleTable", Dict]]:
+        """
+        Load a table stored by write().
+
+        Returns the table and the header with the key and the watermark, or None
+        if there is no such file or if it's broken.
+        """
+        table = cls()
+        try:
+            with open(filename, "rb") as cache:
+                if cache.readline() != SAMPLES_CACHE_MAGIC:
+                    return None
+                header = json.loads(cache.readline())
+                if header["byteorder"] != sys.byteorder:
+                    return None
+                if header["itemsizes"] != [
+                    column.itemsize for column in table.columns()
+                ]:
+                    return None
+
+                table.strings = header["strings"]
+                for column in table.columns():
+                    column.fromfile(cache, header["rows"])
+        except (OSError, EOFError, ValueError, KeyError):
+            return None
+
+        table.string_codes = {string: code for code, string in enumerate(table.strings)}
+        return table, header
 
 
 class Device:
+    """
+    An immutable device, compared case insensitively by name.
+
+    Use Device.get() rather than Device() to get the one shared instance for
+    each device. The lowercase key and the hash are computed once up front,
+    since Devices are used as dict keys all over.
+    """
+
+    __slots__ = ("name", "threads", "key", "_hash")
+
     name: str
     threads: int
+    key: Tuple[str, int]
+    _hash: int
+
+    _instances: ClassVar[Dict[Tuple[str, int], "Device"]] = {}
 
     def __init__(self, name: str, threads: int) -> None:
-        self.name = name
-        self.threads = threads
+        key = (name.lower(), threads)
+        object.__setattr__(self, "name", name)
+        object.__setattr__(self, "threads", threads)
+        object.__setattr__(self, "key", key)
+        object.__setattr__(self, "_hash", hash(key))
+
+    @classmethod
+    def get(cls, name: str, threads: int) -> "Device":
+        """
+        Return the shared Device for name and threads, creating it if needed.
+
+        The first spelling of a name passed in is the one kept.
+        """
+        key = (name.lower(), threads)
+        device = cls._instances.get(key)
+        if device is None:
+            device = cls(name, threads)
+            cls._instances[key] = device
+        return device
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"Device is immutable, can't set {name}")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"Device is immutable, can't delete {name}")
+
+    def __reduce__(self) -> Tuple[Callable[[str, int], "Device"], Tuple[str, int]]:
+        # Unpickle into the shared instance
+        return (Device.get, (self.name, self.threads))
 
     def __eq__(self, o: object) -> bool:
-        them = cast(Device, o)
-        if self.name.lower() != them.name.lower():
-            return False
-        if self.threads != them.threads:
-            return False
-        return True
+        if self is o:
+            return True
+        if not isinstance(o, Device):
+            return NotImplemented
+        return self.key == o.key
 
     def __hash__(self) -> int:
-        return hash((self.name.lower(), self.threads))
+        return self._hash
+
+    def __repr__(self) -> str:
+        return f"Device({self.name!r}, {self.threads})"
 
     def __str__(self) -> str:
         if self.threads:
@@ -63,13 +490,128 @@ class Device:
         return self.name
 
 
-class Environment(NamedTuple):
-    blender_version: str
-    os_name: str
-    scene_name: str
+if HAVE_MSGSPEC:
+    # Typed schemas for the msgspec JSON backend. These list only the fields
+    # that the process_entry_*() functions read, everything else in an entry is
+    # skipped without being decoded into Python objects.
+
+    class JsonStruct(msgspec.Struct, gc=False):
+        # Lets the process_entry_*() functions use these like the dicts from
+        # the other backends. Not a Python level method, because it's called
+        # for every field of every entry.
+        __getitem__ = object.__getattribute__
+
+    class BlenderVersion(JsonStruct):
+        version: str
+
+    class SystemInfo(JsonStruct):
+        system: str
+
+    class SceneStats(JsonStruct):
+        result: str
+        # Only there if result is "OK"
+        total_render_time: Optional[float] = None
+
+    class SceneResult(JsonStruct):
+        name: str
+        stats: SceneStats
+
+    class DeviceInfoV1(JsonStruct):
+        compute_devices: List[Optional[str]]
+        device_type: str
+        num_cpu_threads: int
+
+    class EntryDataV1(JsonStruct):
+        blender_version: BlenderVersion
+        system_info: SystemInfo
+        device_info: DeviceInfoV1
+        scenes: List[SceneResult]
+
+    class EntryV1(JsonStruct, tag_field="schema_version", tag="v1"):
+        schema_version: ClassVar[str] = "v1"
+        data: EntryDataV1
+
+    class ComputeDeviceV2(JsonStruct):
+        name: Optional[str]
+
+    class DeviceInfoV2(JsonStruct):
+        compute_devices: List[ComputeDeviceV2]
+        device_type: str
+        num_cpu_threads: int
+
+    class EntryDataV2(JsonStruct):
+        blender_version: BlenderVersion
+        system_info: SystemInfo
+        device_info: DeviceInfoV2
+        scenes: List[SceneResult]
+
+    class EntryV2(JsonStruct, tag_field="schema_version", tag="v2"):
+        schema_version: ClassVar[str] = "v2"
+        data: EntryDataV2
+
+    class ComputeDeviceV3(JsonStruct):
+        name: Optional[str]
+        type: str
+
+    class DeviceInfoV3(JsonStruct):
+        compute_devices: List[ComputeDeviceV3]
+        num_cpu_threads: int
+
+    class SceneLabel(JsonStruct):
+        label: str
+
+    class RenderStats(JsonStruct):
+        total_render_time: float
+
+    class EntryDataV3(JsonStruct):
+        blender_version: BlenderVersion
+        system_info: SystemInfo
+        device_info: DeviceInfoV3
+        scene: SceneLabel
+        stats: RenderStats
+
+    class EntryV3(JsonStruct, tag_field="schema_version", tag="v3"):
+        schema_version: ClassVar[str] = "v3"
+        data: List[EntryDataV3]
+
+    class EntryV4(EntryV3, tag="v4"):
+        schema_version: ClassVar[str] = "v4"
 
+    ENTRY_DECODER = msgspec.json.Decoder(Union[EntryV1, EntryV2, EntryV3, EntryV4])
 
-def process_entry_v1(entry: Dict) -> List[Sample]:
+    def decode_entry_msgspec(line: bytes) -> Any:
+        try:
+            return ENTRY_DECODER.decode(line)
+        except msgspec.ValidationError:
+            # Unknown schema version or unexpected contents, let the stdlib
+            # decoder and process_opendata() deal with it
+            return json.loads(line)
+
+
+def get_json_decoder(backend: str) -> Callable[[bytes], Any]:
+    """
+    Get a function decoding one opendata line using backend, one of
+    JSON_BACKENDS.
+
+    The decoded entries can be passed to process_entry_*() either way, but
+    with msgspec they contain only the fields those functions need.
+    """
+    if backend == "msgspec":
+        return decode_entry_msgspec
+    if backend == "orjson":
+        return orjson.loads
+    if backend == "json":
+        return json.loads
+    raise ValueError(f"Unsupported JSON backend: {backend}")
+
+
+class DatabaseError(ValueError):
+    """
+    Raised for database entries we can't make sense of.
+    """
+
+
+def process_entry_v1(entry: Dict, table: SampleTable) -> None:
     data = entry["data"]
     blender_version = data["blender_version"]["version"]
     operating_system = data["system_info"]["system"]
@@ -79,34 +621,30 @@ def process_entry_v1(entry: Dict) -> List[Sample]:
 
     if len(compute_devices) != 1:
         # Multiple compute devices, never mind
-        return []
+        return
     device_name = compute_devices[0]
     if not device_name:
         # There are a few of these, just ignore them
-        return []
+        return
 
-    samples: List[Sample] = []
     for scene in data["scenes"]:
         if scene["stats"]["result"] != "OK":
             continue
 
         scene_name = scene["name"]
         render_time_seconds = scene["stats"]["total_render_time"]
-        samples.append(
-            Sample(
-                blender_version=blender_version,
-                os_name=operating_system,
-                device_name=device_name,
-                device_type=device_type,
-                device_threads=num_cpu_threads,
-                scene_name=scene_name,
-                render_time_seconds=render_time_seconds,
-            )
+        table.add(
+            blender_version=blender_version,
+            os_name=operating_system,
+            device_name=device_name,
+            device_type=device_type,
+            device_threads=num_cpu_threads,
+            scene_name=scene_name,
+            render_time_seconds=render_time_seconds,
         )
-    return samples
 
 
-def process_entry_v2(entry: Dict) -> List[Sample]:
+def process_entry_v2(entry: Dict, table: SampleTable) -> None:
     data = entry["data"]
     blender_version = data["blender_version"]["version"]
     operating_system = data["system_info"]["system"]
@@ -114,38 +652,33 @@ def process_entry_v2(entry: Dict) -> List[Sample]:
     compute_devices = data["device_info"]["compute_devices"]
     if len(compute_devices) != 1:
         # Multiple compute devices or none (?), never mind
-        return []
+        return
     compute_device = compute_devices[0]["name"]
     if not compute_device:
         # There are a few of these, just ignore them
-        return []
+        return
 
     device_type = data["device_info"]["device_type"]
     num_cpu_threads = data["device_info"]["num_cpu_threads"]
 
-    samples: List[Sample] = []
     for scene in data["scenes"]:
         if scene["stats"]["result"] != "OK":
             continue
 
         scene_name = scene["name"]
         render_time_seconds = scene["stats"]["total_render_time"]
-        samples.append(
-            Sample(
-                blender_version=blender_version,
-                os_name=operating_system,
-                device_name=compute_device,
-                device_type=device_type,
-                device_threads=num_cpu_threads,
-                scene_name=scene_name,
-                render_time_seconds=render_time_seconds,
-            )
+        table.add(
+            blender_version=blender_version,
+            os_name=operating_system,
+            device_name=compute_device,
+            device_type=device_type,
+            device_threads=num_cpu_threads,
+            scene_name=scene_name,
+            render_time_seconds=render_time_seconds,
         )
-    return samples
 
 
-def process_entry_v3(entry: Dict) -> List[Sample]:
-    samples: List[Sample] = []
+def process_entry_v3(entry: Dict, table: SampleTable) -> None:
     for data in entry["data"]:
         blender_version = data["blender_version"]["version"]
         operating_system = data["system_info"]["system"]
@@ -170,269 +703,3743 @@ def process_entry_v3(entry: Dict) -> List[Sample]:
 
         scene_name = data["scene"]["label"]
         render_time_seconds = data["stats"]["total_render_time"]
-        samples.append(
-            Sample(
-                blender_version=blender_version,
-                os_name=operating_system,
-                device_name=device_name,
-                device_type=device_type,
-                device_threads=num_cpu_threads,
-                scene_name=scene_name,
-                render_time_seconds=render_time_seconds,
-            )
+        table.add(
+            blender_version=blender_version,
+            os_name=operating_system,
+            device_name=device_name,
+            device_type=device_type,
+            device_threads=num_cpu_threads,
+            scene_name=scene_name,
+            render_time_seconds=render_time_seconds,
         )
 
-    return samples
+
+def process_entry(entry: Any, table: SampleTable) -> None:
+    """
+    Add the samples from one decoded opendata entry to table.
+    """
+    if entry["schema_version"] == "v1":
+        process_entry_v1(entry, table)
+    elif entry["schema_version"] == "v2":
+        process_entry_v2(entry, table)
+    elif entry["schema_version"] == "v3":
+        process_entry_v3(entry, table)
+    elif entry["schema_version"] == "v4":
+        # Don't know what the difference is between v3 and v4, just use
+        # the v3 parser for both for now until we figure out why we need
+        # a specific one for v4.
+        process_entry_v3(entry, table)
+    else:
+        raise DatabaseError(f"Unsupported schema version: {entry['schema_version']}")
 
 
-def process_opendata(jsonl: Iterable[bytes]) -> List[Sample]:
-    samples: List[Sample] = []
-    line_count = 0
-    for line in jsonl:
-        line_count += 1
-        entry = json.loads(line)
-        try:
-            if entry["schema_version"] == "v1":
-                samples += process_entry_v1(entry)
-            elif entry["schema_version"] == "v2":
-                samples += process_entry_v2(entry)
-            elif entry["schema_version"] == "v3":
-                samples += process_entry_v3(entry)
-            elif entry["schema_version"] == "v4":
-                # Don't know what the difference is between v3 and v4, just use
-                # the v3 parser for both for now until we figure out why we need
-                # a specific one for v4.
-                samples += process_entry_v3(entry)
+class DeviceMatcher:
+    """
+    Decides which devices we're interested in, based on patterns like the ones
+    in DEVICE_NAMES.
+
+    Patterns are case insensitive substrings of the device names, or case
+    insensitive regexes if prefixed with "re:". Devices matching a pattern
+    prefixed with "!" are excluded, even if they match some other pattern. If
+    there are only exclusion patterns, all other devices match.
+
+    Patterns are matched against canonical device names, the ones we display,
+    see get_canonical_device_name(). That way all spellings of a device are
+    either in or out.
+
+    All patterns are compiled into one regex for including and one for
+    excluding, and the verdict for each device name is memoized. So matching
+    costs one dict lookup per sample, plus two regex searches per distinct
+    device name.
+    """
+
+    def __init__(self, patterns: List[str]) -> None:
+        self.patterns = tuple(patterns)
+        self.plain_includes: List[str] = []
+        includes: List[str] = []
+        excludes: List[str] = []
+        self.only_plain_includes = True
+        for pattern in patterns:
+            targets = includes
+            if pattern.startswith("!"):
+                targets = excludes
+                pattern = pattern[1:]
+
+            if pattern.startswith("re:"):
+                regex = pattern[3:]
+                re.compile(regex)  # Fail early, with the offending pattern
+                if targets is includes:
+                    self.only_plain_includes = False
             else:
-                pprint.pprint(entry, stream=sys.stderr)
-                sys.exit("Unsupported schema version")
-        except Exception:
-            pprint.pprint(entry, stream=sys.stderr)
-            traceback.print_exc(file=sys.stderr)
-            sys.exit(1)
+                regex = re.escape(pattern)
+                if targets is includes:
+                    self.plain_includes.append(pattern)
+            targets.append(f"(?:{regex})")
 
-    print(
-        f"Found {len(samples)} data points in {line_count} lines, at {len(samples)/line_count:.1f} data points per line"
-    )
-    return samples
+        self.include: Optional[Pattern[str]] = None
+        if includes:
+            self.include = re.compile("|".join(includes), re.IGNORECASE)
+        self.exclude: Optional[Pattern[str]] = None
+        if excludes:
+            self.exclude = re.compile("|".join(excludes), re.IGNORECASE)
 
+        self.verdicts: Dict[str, bool] = {}
 
-def get_scene_counts(
-    devices_to_fastest_per_scene: Dict[Device, Dict[str, float]]
-) -> Dict[str, int]:
-    scene_counts: Dict[str, int] = {}
-    for timings in devices_to_fastest_per_scene.values():
-        for scene in timings.keys():
-            scene_counts[scene] = scene_counts.get(scene, 0) + 1
-    return scene_counts
+    def __call__(self, device_name: str) -> bool:
+        verdict = self.verdicts.get(device_name)
+        if verdict is None:
+            canonical_name = get_canonical_device_name(device_name)
+            verdict = True
+            if self.include is not None and not self.include.search(canonical_name):
+                verdict = False
+            elif self.exclude is not None and self.exclude.search(canonical_name):
+                verdict = False
+            self.verdicts[device_name] = verdict
+        return verdict
 
+    def get_line_prefilter(self) -> Optional[Callable[[bytes], bool]]:
+        """
+        Build a case insensitive check for whether any of our include patterns
+        occur in a raw JSON line.
 
-def get_all_scenes(devices_to_fastest_per_scene: Dict[Device, Dict[str, float]]) -> set:
-    all_scenes: Set[str] = set()
-    for timings in devices_to_fastest_per_scene.values():
-        all_scenes.update(timings.keys())
-    return all_scenes
+        Lines failing this check can't contain any matching devices, so they can
+        be skipped without decoding them. Lines passing it still have to be
+        checked after decoding, the name could be anywhere in the line.
 
+        Patterns match canonical names, so raw names spelled differently have
+        to pass too: without the vendor prefix DEVICE_VENDOR_PREFIXES adds, or
+        with the "(R)", "(TM)", " Series" and extra spaces normalizing removes.
 
-def censor_uncommon_devices(
-    devices_to_fastest_per_scene: Dict[Device, Dict[str, float]], min_count: int
-) -> None:
+        Returns None if we can't tell anything from the raw bytes. That's the
+        case for regexes, and for names that could be escaped in the JSON.
+        """
+        if not self.only_plain_includes or not self.plain_includes:
+            return None
+
+        patterns: Set[bytes] = set()
+        for device_name in self.plain_includes:
+            if not device_name:
+                return None
+            for char in device_name:
+                # JSON encoders may escape these, and non-ASCII characters
+                if not (" " <= char <= "~") or char in "\"\\/<>&'":
+                    return None
+            lowercase_name = device_name.lower()
+            patterns.add(lowercase_name.encode("ascii"))
+
+            # If the pattern starts inside a canonical prefix, the raw name
+            # may have the alias prefix instead
+            for prefix, canonical_prefix in DEVICE_VENDOR_PREFIXES.items():
+                canonical_prefix = canonical_prefix.lower()
+                for start in range(len(canonical_prefix)):
+                    overlap = canonical_prefix[start:]
+                    if lowercase_name.startswith(overlap):
+                        alias = prefix + lowercase_name[len(overlap) :]
+                    elif overlap.startswith(lowercase_name):
+                        alias = prefix
+                    else:
+                        continue
+                    patterns.add(alias.encode("ascii"))
+
+        # One lower() plus a substring search per pattern is about four times as
+        # fast as a single re.IGNORECASE alternation of all patterns.
+        def line_prefilter(line: bytes) -> bool:
+            lowercase_line = line.lower()
+            for pattern in patterns:
+                if pattern in lowercase_line:
+                    return True
+
+            # Only normalize lines where that could make a difference. Every
+            # scan of the line costs, so look for the parentheses just once.
+            if not (
+                b"  " in line
+                or b" Series" in line
+                or (b"(" in line and (b"(R)" in line or b"(TM)" in line))
+            ):
+                return False
+            normalized_line = b" ".join(
+                line.replace(b"(R)", b"")
+                .replace(b"(TM)", b"")
+                .replace(b" Series", b"")
+                .split()
+            ).lower()
+            for pattern in patterns:
+                if pattern in normalized_line:
+                    return True
+            return False
+
+        return line_prefilter
+
+
+class SchemaStats:
+    """
+    How many lines of each schema version process_opendata() has parsed, and
+    how long decoding and processing them took.
     """
-    For as long as the devices in the dics have less than min_count
-    scenes in common, drop one device at a time.
 
-    This function modifies the dict.
+    def __init__(self) -> None:
+        # Schema version -> [lines, samples, decode seconds, process seconds]
+        self.versions: Dict[str, List[float]] = {}
 
-    The scene to drop is picked like this:
-    * Find the most common scenes among the devices
-    * Ignore the scenes that all devices have in common
-    * From the rest, find the most common scene
-    * Drop one device that does not have that most common scene
+    def add(
+        self, version: str, samples: int, decode_seconds: float, process_seconds: float
+    ) -> None:
+        stats = self.versions.setdefault(version, [0, 0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += samples
+        stats[2] += decode_seconds
+        stats[3] += process_seconds
+
+    def merge(self, other: "SchemaStats") -> None:
+        for version, other_stats in other.versions.items():
+            stats = self.versions.setdefault(version, [0, 0, 0.0, 0.0])
+            for index, value in enumerate(other_stats):
+                stats[index] += value
+
+
+class StageStats:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+
+        # Peak for the whole process so far, None if unavailable
+        self.peak_rss_mb: Optional[float] = None
+
+        # Peak during this stage, None unless running with -X tracemalloc
+        self.traced_peak_mb: Optional[float] = None
+
+        # Set by the stage itself, for reporting throughput
+        self.items = 0
+        self.unit = ""
+
+        self.cprofile: Optional[cProfile.Profile] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "wall_seconds": self.wall_seconds,
+            "cpu_seconds": self.cpu_seconds,
+            "peak_rss_mb": self.peak_rss_mb,
+            "traced_peak_mb": self.traced_peak_mb,
+            "items": self.items,
+            "unit": self.unit,
+        }
+
+
+def get_peak_rss_mb() -> Optional[float]:
+    if not HAVE_RESOURCE:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_peak_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    peak_rss = max(peak_rss, children_peak_rss)
+    if sys.platform == "darwin":
+        # Bytes on macOS, kilobytes elsewhere
+        return peak_rss / (1024 * 1024)
+    return peak_rss / 1024
+
+
+class Profiler:
     """
-    while True:
-        if len(devices_to_fastest_per_scene) <= 1:
-            sys.exit(
-                f"Unable to find any set of devices with {min_count} scenes in common"
-            )
+    Records wall time, CPU time, memory usage and item counts for each stage of
+    the pipeline.
 
-        scene_counts = get_scene_counts(devices_to_fastest_per_scene)
-        common_scenes: Set[str] = set()
-        for scene, count in scene_counts.items():
-            if count == len(devices_to_fastest_per_scene):
-                common_scenes.add(scene)
-        if len(common_scenes) >= min_count:
-            return
+    CPU time includes worker processes once they have exited. Peak memory
+    per stage is only available when running under "python3 -X tracemalloc",
+    since tracing slows everything down a lot.
 
-        # Ignore the scenes that everybody has in common
-        for scene in common_scenes:
-            del scene_counts[scene]
+    If with_schema_stats is set, process_opendata() also records statistics
+    per schema version into schema_stats. If with_cprofile is set, each stage
+    is run under cProfile, so that the hottest one can be dumped.
+    """
 
-        assert scene_counts  # If this fails: WTF?
+    def __init__(
+        self, with_schema_stats: bool = False, with_cprofile: bool = False
+    ) -> None:
+        self.with_cprofile = with_cprofile
+        self.stages: List[StageStats] = []
+        self.schema_stats: Optional[SchemaStats] = None
+        if with_schema_stats:
+            self.schema_stats = SchemaStats()
 
-        # Find the most common remaining scene
-        most_common_incomplete_scene = sorted(
-            scene_counts.keys(), key=scene_counts.get
-        )[-1]
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[StageStats]:
+        stats = StageStats(name)
+        self.stages.append(stats)
 
-        # Find a device that doesn't have that most common scene...
-        for device, timings in devices_to_fastest_per_scene.items():
-            if most_common_incomplete_scene in timings:
-                continue
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+        if self.with_cprofile:
+            stats.cprofile = cProfile.Profile()
+            stats.cprofile.enable()
+
+        times = os.times()
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            stats.wall_seconds = time.perf_counter() - start
+            end_times = os.times()
+            stats.cpu_seconds = sum(end_times[:4]) - sum(times[:4])
+
+            if stats.cprofile is not None:
+                stats.cprofile.disable()
+            stats.peak_rss_mb = get_peak_rss_mb()
+            if tracing:
+                stats.traced_peak_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+
+    def hottest_stage(self) -> Optional[StageStats]:
+        if not self.stages:
+            return None
+        return max(self.stages, key=lambda stats: stats.wall_seconds)
 
-            # ... and drop it
+    def as_dict(self) -> Dict[str, Any]:
+        report: Dict[str, Any] = {
+            "stages": [stats.as_dict() for stats in self.stages]
+        }
+        if self.schema_stats is not None:
+            report["schemas"] = {
+                version: {
+                    "lines": lines,
+                    "samples": samples,
+                    "decode_seconds": decode_seconds,
+                    "process_seconds": process_seconds,
+                }
+                for version, (
+                    lines,
+                    samples,
+                    decode_seconds,
+                    process_seconds,
+                ) in sorted(self.schema_stats.versions.items())
+            }
+        return report
+
+    def print_table(self, file: IO[str]) -> None:
+        def to_mb_string(mb: Optional[float]) -> str:
+            return "-" if mb is None else f"{mb:.0f}"
+
+        print(
+            f"{'Stage':<12} {'Wall s':>8} {'CPU s':>8} {'Peak RSS MB':>11} {'Traced MB':>9}  Throughput",
+            file=file,
+        )
+        for stats in self.stages:
+            throughput = ""
+            if stats.unit and stats.wall_seconds > 0:
+                throughput = f"{stats.items / stats.wall_seconds:,.0f} {stats.unit}/s"
             print(
-                f"Dropping {device} lacking timings for {most_common_incomplete_scene}"
+                f"{stats.name:<12} {stats.wall_seconds:8.3f} {stats.cpu_seconds:8.3f} {to_mb_string(stats.peak_rss_mb):>11} {to_mb_string(stats.traced_peak_mb):>9}  {throughput}",
+                file=file,
             )
-            del devices_to_fastest_per_scene[device]
-            break
 
+        if self.schema_stats is None or not self.schema_stats.versions:
+            return
+        print("", file=file)
+        print(
+            f"{'Schema':<12} {'Lines':>8} {'Samples':>8} {'Decode s':>9} {'Process s':>9}  Throughput",
+            file=file,
+        )
+        for version, (lines, samples, decode_seconds, process_seconds) in sorted(
+            self.schema_stats.versions.items()
+        ):
+            throughput = ""
+            if decode_seconds + process_seconds > 0:
+                throughput = f"{lines / (decode_seconds + process_seconds):,.0f} lines/s"
+            print(
+                f"{version:<12} {lines:8.0f} {samples:8.0f} {decode_seconds:9.3f} {process_seconds:9.3f}  {throughput}",
+                file=file,
+            )
 
-def seconds_to_string(seconds: float) -> str:
-    seconds_count = int(seconds) % 60
-    minutes_count = (int(seconds) // 60) % 60
-    hours_count = int(seconds) // 3600
-    if hours_count > 0:
-        return f"{hours_count:2d}h{minutes_count:02d}m"
-    return f"{minutes_count:2d}m{seconds_count:02d}s"
 
+def process_opendata(
+    jsonl: Iterable[bytes],
+    table: SampleTable,
+    line_prefilter: Optional[Callable[[bytes], bool]] = None,
+    json_backend: str = JSON_BACKENDS[0],
+    schema_stats: Optional[SchemaStats] = None,
+) -> int:
+    """
+    Parse opendata lines one at a time into table.
 
-def to_duration_description(seconds: float, threads: int) -> str:
-    result = seconds_to_string(seconds)
-    if threads > 0:
-        single_core_duration = seconds_to_string(seconds * threads)
-        result += f" (single threaded: {single_core_duration})"
-    else:
-        result += "                          "
+    The lines can come straight from an open zip member, nothing is read ahead
+    so the whole decompressed database never has to fit in memory.
 
-    return result
+    If line_prefilter is set, lines it rejects are skipped unparsed. Use a
+    table with a device_filter to also drop the non-matching samples from the
+    lines that do get parsed.
 
+    Lines are decoded using json_backend, see get_json_decoder().
 
-def get_zipfile_name() -> str:
-    if os.path.exists(LOCAL_DATABASE_FILENAME):
-        print(f"Database found in {LOCAL_DATABASE_FILENAME}")
-        return LOCAL_DATABASE_FILENAME
+    If schema_stats is set, time spent per schema version is added to it. This
+    costs a few timer calls per line.
 
-    print(f'Downloading performance database into "{LOCAL_DATABASE_FILENAME}"...')
-    request.urlretrieve(
-        "https://opendata.blender.org/snapshots/opendata-latest.zip",
-        LOCAL_DATABASE_FILENAME,
-    )
-    return LOCAL_DATABASE_FILENAME
+    Returns the number of lines read.
+    """
+    decode_entry = get_json_decoder(json_backend)
+    start = decoded = 0.0
+    sample_count = 0
 
+    line_count = 0
+    for line in jsonl:
+        if not line.strip():
+            # Appended snapshots may leave an empty line behind
+            continue
+        line_count += 1
+        if line_prefilter is not None and not line_prefilter(line):
+            continue
 
-def main() -> None:
-    # List samples for all devices we're interested in
-    samples: List[Sample] = []
-    with zipfile.ZipFile(get_zipfile_name()) as opendata:
-        for entry in opendata.infolist():
-            if not entry.filename.endswith(".jsonl"):
-                continue
-            db_size_mb = entry.file_size // (1024 * 1024)
-            print(f"Parsing {db_size_mb}MB database...")
-            with opendata.open(entry) as jsonl:
-                entry_samples = process_opendata(jsonl.readlines())
-
-                lowercase_device_names = []
-                for device_name in DEVICE_NAMES:
-                    lowercase_device_names.append(device_name.lower())
-
-                for sample in entry_samples:
-                    # Filter out devices we're interested in
-                    match = False
-                    for device_name in lowercase_device_names:
-                        if device_name in sample.device_name.lower():
-                            match = True
-                    if not match:
-                        continue
+        if schema_stats is not None:
+            sample_count = len(table)
+            start = time.perf_counter()
+        entry = decode_entry(line)
+        if schema_stats is not None:
+            decoded = time.perf_counter()
+        try:
+            process_entry(entry, table)
+        except DatabaseError:
+            raise
+        except Exception as e:
+            # Entries can be big, the start should tell which one it is
+            raise DatabaseError(f"Unexpected entry {entry!r:.300}: {e!r}") from e
+        if schema_stats is not None:
+            schema_stats.add(
+                entry["schema_version"],
+                len(table) - sample_count,
+                decoded - start,
+                time.perf_counter() - decoded,
+            )
 
-                    samples.append(sample)
-    print(f"Found {len(samples)} samples for the requested devices")
-
-    replace_count = 0
-    for i, sample in enumerate(samples):
-        # Join and split coalesces consecutive whitespace:
-        # https://stackoverflow.com/a/2077944/473672
-        normalized_name = " ".join(
-            sample.device_name.replace("(R)", "")
-            .replace("(TM)", "")
-            .replace(" Series", "")
-            .split()
-        )
-        if normalized_name != sample.device_name:
-            samples[i] = sample._replace(device_name=normalized_name)
-            replace_count += 1
-    print(f"Normalized {replace_count} device names")
-
-    # Map devices to the fastest recorded rendering per scene
-    devices_to_fastest_per_scene: Dict[Device, Dict[str, float]] = {}
-    for sample in samples:
-        device_threads = sample.device_threads
-        if sample.device_type != "CPU":
-            # The threads is for CPUs only, coalesce GPU devices with different thread counts
-            device_threads = 0
-        device = Device(name=sample.device_name, threads=device_threads)
+    return line_count
 
-        scenes_dict = devices_to_fastest_per_scene.get(device, {})
-        if not scenes_dict:
-            # Not already present, add the new one
-            devices_to_fastest_per_scene[device] = scenes_dict
 
-        scene_name = sample.scene_name
-        if scene_name not in scenes_dict:
-            scenes_dict[scene_name] = sample.render_time_seconds
-        else:
-            current_best = scenes_dict[scene_name]
-            if sample.render_time_seconds < current_best:
-                scenes_dict[scene_name] = sample.render_time_seconds
+class BinaryLines(Protocol):
+    """
+    What parsing needs from a database: a binary file opened from the zip, or
+    a HashingReader around one.
+    """
 
-    censor_uncommon_devices(devices_to_fastest_per_scene, MIN_COMMON_SCENES_COUNT)
+    def read(self, size: int = -1, /) -> bytes:
+        ...
 
-    # Figure out which common scenes we have
-    common_scenes = set(get_all_scenes(devices_to_fastest_per_scene))
-    for timings in devices_to_fastest_per_scene.values():
-        common_scenes.intersection_update(timings.keys())
+    def __iter__(self) -> Iterator[bytes]:
+        ...
 
-    print(
-        f"Found {len(devices_to_fastest_per_scene)} matching devices with {len(common_scenes)} scenes in common"
-    )
-    if not devices_to_fastest_per_scene:
-        sys.exit("FAILED: No matching devices")
 
-    scene_counts = get_scene_counts(devices_to_fastest_per_scene)
-    top_scenes: List[str] = sorted(
-        scene_counts.keys(), key=scene_counts.get, reverse=True
-    )
-    print("Most common scenes (with counts):")
-    for scene in top_scenes:
-        print(f"{scene_counts[scene]:4d}: {scene}")
+def iterate_chunks(
+    jsonl: BinaryLines, chunk_size: int
+) -> Generator[bytes, None, None]:
+    """
+    Read jsonl in chunks of about chunk_size bytes, each ending at a line break.
+    """
+    remainder = b""
+    while True:
+        block = jsonl.read(chunk_size)
+        if not block:
+            break
+        last_newline = block.rfind(b"\n")
+        if last_newline < 0:
+            remainder += block
+            continue
+        yield remainder + block[: last_newline + 1]
+        remainder = block[last_newline + 1 :]
+    if remainder:
+        yield remainder
 
-    print(
-        f"Matching devices have {len(common_scenes)}/{len(get_all_scenes(devices_to_fastest_per_scene))} scenes in common"
-    )
-    if not common_scenes:
-        sys.exit("FAILED: No common scenes")
 
-    # For all devices, compute the geometric mean of all common-scene numbers
-    devices_to_total_times: Dict[Device, float] = {}
-    for device, timings in devices_to_fastest_per_scene.items():
-        product = 1.0
-        for scene in common_scenes:
-            product *= devices_to_fastest_per_scene[device][scene]
-        devices_to_total_times[device] = product ** (1.0 / len(common_scenes))
+T = TypeVar("T")
 
-    # Rank devices per sum-of-common-scenes numbers
-    top_devices: List[Device] = sorted(
-        list(devices_to_total_times.keys()), key=devices_to_total_times.get
-    )
 
-    print("")
-    print("List of devices, from fastest to slowest")
-    for device in top_devices:
-        threads = device.threads
-        duration_string = to_duration_description(
-            devices_to_total_times[device], threads
-        )
-        print(f"{duration_string}: {device}")
+def read_ahead(items: Iterator[T], depth: int) -> Generator[T, None, None]:
+    """
+    Iterate over items in a separate thread, staying at most depth items
+    ahead of the caller.
+
+    zlib and hashlib release the GIL while they work, so this lets
+    decompressing the database overlap with parsing it. The bounded queue
+    makes the reader wait for the parser, which caps memory usage.
+
+    Callers that may stop early must close() the returned generator, or the
+    thread keeps waiting for them until it's garbage collected.
+    """
+    end = object()
+    results: queue.Queue = queue.Queue(depth)
+    stop = threading.Event()
+
+    def put(result: Tuple[Any, Optional[BaseException]]) -> bool:
+        # Give up if the caller stops listening, rather than block forever
+        while not stop.is_set():
+            try:
+                results.put(result, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce() -> None:
+        try:
+            for item in items:
+                if not put((item, None)):
+                    return
+        except Exception as e:
+            put((end, e))
+        else:
+            put((end, None))
+
+    reader = threading.Thread(target=produce, name="read-ahead", daemon=True)
+    reader.start()
+    try:
+        while True:
+            item, exception = results.get()
+            if item is end:
+                if exception is not None:
+                    raise exception
+                return
+            yield item
+    finally:
+        stop.set()
+        # Make room for anything the reader is trying to put
+        with contextlib.suppress(queue.Empty):
+            while True:
+                results.get_nowait()
+        reader.join()
+
+
+def process_opendata_chunk(
+    chunk: bytes,
+    device_matcher: Optional[DeviceMatcher],
+    json_backend: str,
+    with_schema_stats: bool,
+) -> Tuple[SampleTable, int, Optional[SchemaStats]]:
+    """
+    Parse one chunk from iterate_chunks() in a worker process.
+
+    Returns the parsed samples, the number of lines read and, if
+    with_schema_stats is set, statistics per schema version.
+    """
+    schema_stats: Optional[SchemaStats] = None
+    if with_schema_stats:
+        schema_stats = SchemaStats()
+    table = SampleTable(device_matcher)
+    line_prefilter = None
+    if device_matcher is not None:
+        line_prefilter = device_matcher.get_line_prefilter()
+    line_count = process_opendata(
+        chunk.splitlines(), table, line_prefilter, json_backend, schema_stats
+    )
+    return table, line_count, schema_stats
+
+
+def process_opendata_parallel(
+    jsonl: BinaryLines,
+    table: SampleTable,
+    jobs: int,
+    device_matcher: Optional[DeviceMatcher] = None,
+    json_backend: str = JSON_BACKENDS[0],
+    schema_stats: Optional[SchemaStats] = None,
+    pipeline: bool = False,
+) -> int:
+    """
+    Like process_opendata(), but parses chunks of lines in jobs processes.
+
+    Chunks are merged into table in file order, so the result is the same as
+    from process_opendata().
+
+    If pipeline is set, chunks are read in a separate thread, see
+    read_ahead().
+    """
+    line_count = 0
+
+    def merge(result: Tuple[SampleTable, int, Optional[SchemaStats]]) -> None:
+        nonlocal line_count
+        chunk_table, chunk_line_count, chunk_schema_stats = result
+        table.extend(chunk_table)
+        line_count += chunk_line_count
+        if schema_stats is not None and chunk_schema_stats is not None:
+            schema_stats.merge(chunk_schema_stats)
+
+    with multiprocessing.Pool(jobs) as pool:
+        # Don't read ahead more than a couple of chunks per process, or the
+        # whole decompressed database could end up in the queue
+        pending: Deque = collections.deque()
+        chunks = iterate_chunks(jsonl, PARSE_CHUNK_SIZE)
+        if pipeline:
+            chunks = read_ahead(chunks, jobs * 2)
+        with contextlib.closing(chunks):
+            for chunk in chunks:
+                pending.append(
+                    pool.apply_async(
+                        process_opendata_chunk,
+                        (
+                            chunk,
+                            device_matcher,
+                            json_backend,
+                            schema_stats is not None,
+                        ),
+                    )
+                )
+                if len(pending) < jobs * 2:
+                    continue
+                merge(pending.popleft().get())
+
+        while pending:
+            merge(pending.popleft().get())
+
+    return line_count
+
+
+def normalize_device_name(device_name: str) -> str:
+    # Join and split coalesces consecutive whitespace:
+    # https://stackoverflow.com/a/2077944/473672
+    return " ".join(
+        device_name.replace("(R)", "")
+        .replace("(TM)", "")
+        .replace(" Series", "")
+        .split()
+    )
+
+
+def get_canonical_device_name(raw_name: str) -> str:
+    """
+    Normalize raw_name, and give it the vendor prefix from
+    DEVICE_VENDOR_PREFIXES if it lacks one.
+    """
+    canonical_name = normalize_device_name(raw_name)
+    lowercase_name = canonical_name.lower()
+    for prefix, canonical_prefix in DEVICE_VENDOR_PREFIXES.items():
+        if lowercase_name.startswith(prefix):
+            return canonical_prefix + canonical_name[len(prefix) :]
+    return canonical_name
+
+
+class DeviceRegistry:
+    """
+    Hands out one canonical Device per distinct (normalized name, threads).
+
+    Each raw device name is normalized and looked up in DEVICE_VENDOR_PREFIXES
+    only once, so "GeForce RTX 2080 Ti" and "NVIDIA GeForce(R) RTX 2080 Ti"
+    both end up as the same Device. Devices are numbered in the order they are
+    first seen, and the first spelling seen of a name is the one displayed.
+    """
+
+    def __init__(self) -> None:
+        self.canonical_names: Dict[str, str] = {}
+        self.name_ids: Dict[str, int] = {}
+        self.device_ids: Dict[Tuple[int, int], int] = {}
+        self.devices: List[Device] = []
+
+    def canonical_name(self, raw_name: str) -> str:
+        canonical_name = self.canonical_names.get(raw_name)
+        if canonical_name is None:
+            canonical_name = get_canonical_device_name(raw_name)
+            self.canonical_names[raw_name] = canonical_name
+        return canonical_name
+
+    def get_device_id(self, raw_name: str, threads: int) -> int:
+        canonical_name = self.canonical_name(raw_name)
+
+        # Device names compare case insensitively
+        name_key = canonical_name.lower()
+        name_id = self.name_ids.get(name_key)
+        if name_id is None:
+            name_id = len(self.name_ids)
+            self.name_ids[name_key] = name_id
+
+        device_id = self.device_ids.get((name_id, threads))
+        if device_id is None:
+            device_id = len(self.devices)
+            self.device_ids[(name_id, threads)] = device_id
+            self.devices.append(Device.get(canonical_name, threads))
+        return device_id
+
+    def get_device(self, device_id: int) -> Device:
+        return self.devices[device_id]
+
+
+class TopK:
+    """
+    The TOP_K_SAMPLES fastest render times seen, in a bounded max heap.
+
+    The result is the slowest of the ones kept.
+    """
+
+    __slots__ = ("negated_times",)
+
+    def __init__(self) -> None:
+        # heapq only does min heaps
+        self.negated_times: List[float] = []
+
+    def add(self, render_time_seconds: float) -> None:
+        if len(self.negated_times) < TOP_K_SAMPLES:
+            heapq.heappush(self.negated_times, -render_time_seconds)
+        elif render_time_seconds < -self.negated_times[0]:
+            heapq.heapreplace(self.negated_times, -render_time_seconds)
+
+    def merge(self, other: "TopK") -> None:
+        for negated_time in other.negated_times:
+            self.add(-negated_time)
+
+    def result(self) -> float:
+        return -self.negated_times[0]
+
+    def order_statistic(self, count: int) -> int:
+        """
+        Which of count sorted render times result() picks, counting from 0.
+        """
+        return min(TOP_K_SAMPLES, count) - 1
+
+    def to_json(self) -> Any:
+        return sorted(-negated_time for negated_time in self.negated_times)
+
+    def load_json(self, data: Any) -> None:
+        self.negated_times = [-render_time_seconds for render_time_seconds in data]
+        heapq.heapify(self.negated_times)
+
+
+# Bucket growth factor for QuantileSketch, see DDSketch:
+# https://arxiv.org/abs/1908.10693
+QUANTILE_SKETCH_LOG_GAMMA = math.log(
+    (1 + QUANTILE_SKETCH_ACCURACY) / (1 - QUANTILE_SKETCH_ACCURACY)
+)
+
+
+class QuantileSketch:
+    """
+    Estimates a quantile of the render times seen, within
+    QUANTILE_SKETCH_ACCURACY relative error.
+
+    Render times are counted in logarithmically sized buckets, so memory use
+    is bounded by the number of buckets between QUANTILE_SKETCH_MIN_SECONDS
+    and QUANTILE_SKETCH_MAX_SECONDS, no matter how many samples there are.
+    Sketches of the same quantile can be merged by adding up their buckets.
+    """
+
+    __slots__ = ("quantile", "bucket_counts", "count")
+
+    def __init__(self, quantile: float) -> None:
+        self.quantile = quantile
+        self.bucket_counts: Dict[int, int] = {}
+        self.count = 0
+
+    def add(self, render_time_seconds: float) -> None:
+        render_time_seconds = min(
+            max(render_time_seconds, QUANTILE_SKETCH_MIN_SECONDS),
+            QUANTILE_SKETCH_MAX_SECONDS,
+        )
+        bucket = math.ceil(math.log(render_time_seconds) / QUANTILE_SKETCH_LOG_GAMMA)
+        self.bucket_counts[bucket] = self.bucket_counts.get(bucket, 0) + 1
+        self.count += 1
+
+    def merge(self, other: "QuantileSketch") -> None:
+        for bucket, count in other.bucket_counts.items():
+            self.bucket_counts[bucket] = self.bucket_counts.get(bucket, 0) + count
+        self.count += other.count
+
+    def result(self) -> float:
+        rank = self.quantile * (self.count - 1)
+        seen = 0
+        for bucket in sorted(self.bucket_counts):
+            seen += self.bucket_counts[bucket]
+            if seen > rank:
+                break
+
+        # The middle of the bucket, relatively speaking
+        return 2 * math.exp(bucket * QUANTILE_SKETCH_LOG_GAMMA) / (
+            1 + math.exp(QUANTILE_SKETCH_LOG_GAMMA)
+        )
+
+    def order_statistic(self, count: int) -> int:
+        """
+        Which of count sorted render times result() approximates, counting
+        from 0.
+        """
+        return int(self.quantile * (count - 1))
+
+    def to_json(self) -> Any:
+        # JSON object keys must be strings
+        return {str(bucket): count for bucket, count in self.bucket_counts.items()}
+
+    def load_json(self, data: Any) -> None:
+        self.bucket_counts = {int(bucket): count for bucket, count in data.items()}
+        self.count = sum(self.bucket_counts.values())
+
+
+# Ways of summarizing the samples for one device and scene, by --aggregator
+# name. "fastest" is special cased in get_fastest_per_scene() for speed.
+AGGREGATORS: Dict[str, Optional[Callable[[], Any]]] = {
+    "fastest": None,
+    "top-k": TopK,
+    "median": lambda: QuantileSketch(0.5),
+    "p10": lambda: QuantileSketch(0.1),
+}
+
+
+class SampleList:
+    """
+    All render times seen, for get_samples_per_scene().
+
+    The result is the sorted render times.
+    """
+
+    __slots__ = ("render_times",)
+
+    def __init__(self) -> None:
+        self.render_times: List[float] = []
+
+    def add(self, render_time_seconds: float) -> None:
+        self.render_times.append(render_time_seconds)
+
+    def merge(self, other: "SampleList") -> None:
+        self.render_times.extend(other.render_times)
+
+    def result(self) -> List[float]:
+        return sorted(self.render_times)
+
+
+def get_order_statistic(aggregator: str, count: int) -> int:
+    """
+    Which of count sorted render times the aggregator picks, counting from 0.
+    """
+    create_state = AGGREGATORS[aggregator]
+    if create_state is None:
+        return 0
+    return create_state().order_statistic(count)
+
+
+def summarize_samples(
+    devices_to_samples_per_scene: Dict[Device, Dict[str, List[float]]],
+    aggregator: str = "fastest",
+) -> Dict[Device, Dict[str, float]]:
+    """
+    Summarize get_samples_per_scene() output like get_fastest_per_scene() would
+    have with the aggregator.
+    """
+    if aggregator not in AGGREGATORS:
+        raise ValueError(f"Unsupported aggregator: {aggregator}")
+    create_state = AGGREGATORS[aggregator]
+
+    devices_to_fastest_per_scene: Dict[Device, Dict[str, float]] = {}
+    for device, samples_per_scene in devices_to_samples_per_scene.items():
+        scenes_dict: Dict[str, float] = {}
+        for scene_name, render_times in samples_per_scene.items():
+            if create_state is None:
+                scenes_dict[scene_name] = min(render_times)
+                continue
+            state = create_state()
+            for render_time_seconds in render_times:
+                state.add(render_time_seconds)
+            scenes_dict[scene_name] = state.result()
+        devices_to_fastest_per_scene[device] = scenes_dict
+    return devices_to_fastest_per_scene
+
+
+def no_progress(message: str) -> None:
+    pass
+
+
+def collect_per_scene(
+    table: SampleTable,
+    create_state: Optional[Callable[[], Any]],
+    device_codes: Optional[Set[int]] = None,
+    registry: Optional[DeviceRegistry] = None,
+    device_rows: Optional[Dict[int, array]] = None,
+    environment_filter: Optional[Callable[[Environment], bool]] = None,
+    progress: Optional[Callable[[str], None]] = None,
+    environment_rows: Optional[Dict[Tuple[int, int, int], array]] = None,
+) -> Dict[Device, Dict[str, Any]]:
+    """
+    Map devices to a state per scene, made by create_state() and fed all
+    samples for that device and scene, for the samples in table with one of
+    device_codes. If create_state is None, the state is the fastest time
+    instead. If device_codes is None, all devices are included. If
+    environment_filter is set, only samples from Environments it accepts are
+    included.
+
+    The Devices come from registry, pass one in to get the same Device
+    objects across calls.
+
+    If device_rows from table.get_device_rows() is passed, only the samples
+    for device_codes are visited rather than all of them. Likewise for
+    environment_rows from table.get_environment_rows() and the Environments
+    accepted by environment_filter.
+
+    Devices and scenes are listed in the order they first appear in the table.
+
+    How many samples there were and how many names were normalized is passed
+    to progress, if set.
+    """
+    if progress is None:
+        progress = no_progress
+
+    strings = table.strings
+    string_count = max(len(strings), 1)
+    cpu_code = table.string_codes.get("CPU")
+
+    samples: Iterable[Tuple[int, int, int, int, float]] = zip(
+        table.device_name,
+        table.device_type,
+        table.device_threads,
+        table.scene_name,
+        table.render_time_seconds,
+    )
+    rows: Optional[Iterable[int]] = None
+    if device_rows is not None and device_codes is not None:
+        # Visit the rows in table order, so that devices come out in the same
+        # order either way
+        rows = sorted(
+            row
+            for device_code in device_codes
+            for row in device_rows.get(device_code, ())
+        )
+    if environment_filter is not None and environment_rows is not None:
+        accepted_rows = itertools.chain.from_iterable(
+            rows_of_environment
+            for key, rows_of_environment in environment_rows.items()
+            if environment_filter(
+                Environment(
+                    blender_version=strings[key[0]],
+                    os_name=strings[key[1]],
+                    scene_name=strings[key[2]],
+                )
+            )
+        )
+        if rows is None:
+            rows = sorted(accepted_rows)
+        else:
+            rows = sorted(set(rows).intersection(accepted_rows))
+    elif environment_filter is not None:
+        if rows is None:
+            rows = range(len(table))
+        rows = table.filter_environments(rows, environment_filter)
+    if rows is not None:
+        samples = (
+            (
+                table.device_name[row],
+                table.device_type[row],
+                table.device_threads[row],
+                table.scene_name[row],
+                table.render_time_seconds[row],
+            )
+            for row in rows
+        )
+
+    # Find the minimum per (threads, device, scene). Those are all small
+    # integers, pack them into a single int so that every sample costs just
+    # one dict lookup.
+    fastest: Dict[int, Any] = {}
+    sample_count = 0
+    for device_code, type_code, device_threads, scene_code, render_time_seconds in samples:
+        if device_codes is not None and device_code not in device_codes:
+            continue
+        sample_count += 1
+
+        if type_code != cpu_code:
+            # The threads is for CPUs only, coalesce GPU devices with different thread counts
+            device_threads = 0
+        key = (device_threads * string_count + device_code) * string_count + scene_code
+
+        current_best = fastest.get(key)
+        if create_state is not None:
+            # Some other aggregator, keep its state instead of a minimum
+            if current_best is None:
+                current_best = create_state()
+                fastest[key] = current_best
+            current_best.add(render_time_seconds)
+        elif current_best is None or render_time_seconds < current_best:
+            fastest[key] = render_time_seconds
+    progress(f"Found {sample_count} samples for the requested devices")
+
+    if registry is None:
+        registry = DeviceRegistry()
+
+    # Now unpack the (relatively few) minimums into Devices and scene names
+    device_names: Set[int] = set()
+    devices: Dict[int, Device] = {}
+    devices_to_fastest_per_scene: Dict[Device, Dict[str, Any]] = {}
+    for key, render_time_seconds in fastest.items():
+        device_key, scene_code = divmod(key, string_count)
+        device = devices.get(device_key)
+        if device is None:
+            device_threads, device_code = divmod(device_key, string_count)
+            device_names.add(device_code)
+            device = registry.get_device(
+                registry.get_device_id(strings[device_code], device_threads)
+            )
+            devices[device_key] = device
+
+        # Different raw names can normalize into the same device, so we may
+        # still have to pick the fastest here
+        scenes_dict = devices_to_fastest_per_scene.setdefault(device, {})
+        scene_name = strings[scene_code]
+        current_best = scenes_dict.get(scene_name)
+        if current_best is None:
+            scenes_dict[scene_name] = render_time_seconds
+        elif create_state is not None:
+            current_best.merge(render_time_seconds)
+        elif render_time_seconds < current_best:
+            scenes_dict[scene_name] = render_time_seconds
+
+    replace_count = sum(
+        1
+        for code in device_names
+        if registry.canonical_name(strings[code]) != strings[code]
+    )
+    progress(f"Normalized {replace_count} device names")
+
+    return devices_to_fastest_per_scene
+
+
+def get_fastest_per_scene(
+    table: SampleTable,
+    device_codes: Optional[Set[int]] = None,
+    registry: Optional[DeviceRegistry] = None,
+    device_rows: Optional[Dict[int, array]] = None,
+    environment_filter: Optional[Callable[[Environment], bool]] = None,
+    aggregator: str = "fastest",
+    with_states: bool = False,
+    progress: Optional[Callable[[str], None]] = None,
+    environment_rows: Optional[Dict[Tuple[int, int, int], array]] = None,
+) -> Dict[Device, Dict[str, Any]]:
+    """
+    Map devices to the fastest recorded rendering per scene, see
+    collect_per_scene() for the other parameters.
+
+    Instead of the fastest rendering, another one of AGGREGATORS can be used
+    for summarizing the samples of each device and scene. With with_states,
+    the aggregator states are returned rather than their results, for merging
+    with other states later. The state of "fastest" is the fastest time.
+    """
+    if aggregator not in AGGREGATORS:
+        raise ValueError(f"Unsupported aggregator: {aggregator}")
+    create_state = AGGREGATORS[aggregator]
+
+    devices_to_fastest_per_scene = collect_per_scene(
+        table,
+        create_state,
+        device_codes,
+        registry,
+        device_rows,
+        environment_filter,
+        progress,
+        environment_rows,
+    )
+    if create_state is not None and not with_states:
+        for scenes_dict in devices_to_fastest_per_scene.values():
+            for scene_name, state in scenes_dict.items():
+                scenes_dict[scene_name] = state.result()
+    return devices_to_fastest_per_scene
+
+
+def get_samples_per_scene(
+    table: SampleTable,
+    device_codes: Optional[Set[int]] = None,
+    registry: Optional[DeviceRegistry] = None,
+    device_rows: Optional[Dict[int, array]] = None,
+    environment_filter: Optional[Callable[[Environment], bool]] = None,
+    progress: Optional[Callable[[str], None]] = None,
+    environment_rows: Optional[Dict[Tuple[int, int, int], array]] = None,
+) -> Dict[Device, Dict[str, List[float]]]:
+    """
+    Map devices to all their render times per scene, sorted, for resampling
+    them in bootstrap_ranking(). See collect_per_scene() for the parameters.
+    """
+    return {
+        device: {
+            scene_name: sample_list.result()
+            for scene_name, sample_list in scenes_dict.items()
+        }
+        for device, scenes_dict in collect_per_scene(
+            table,
+            SampleList,
+            device_codes,
+            registry,
+            device_rows,
+            environment_filter,
+            progress,
+            environment_rows,
+        ).items()
+    }
+
+
+def get_scene_counts(
+    devices_to_fastest_per_scene: Dict[Device, Dict[str, float]]
+) -> Dict[str, int]:
+    scene_counts: Dict[str, int] = {}
+    for timings in devices_to_fastest_per_scene.values():
+        for scene in timings.keys():
+            scene_counts[scene] = scene_counts.get(scene, 0) + 1
+    return scene_counts
+
+
+def get_all_scenes(devices_to_fastest_per_scene: Dict[Device, Dict[str, float]]) -> set:
+    all_scenes: Set[str] = set()
+    for timings in devices_to_fastest_per_scene.values():
+        all_scenes.update(timings.keys())
+    return all_scenes
+
+
+class SceneCoverage:
+    """
+    Index of which devices have timings for which scenes.
+
+    Devices are removed through remove(), which only has to update the scenes
+    of the removed device. Finding the most common incomplete scene and a device
+    lacking it is then cheap, even for thousands of devices.
+
+    Ties are broken the same way censor_uncommon_devices() always has: by the
+    order the devices and their scenes have in the dict.
+    """
+
+    def __init__(self, devices_to_fastest_per_scene: Dict[Device, Dict[str, float]]) -> None:
+        # We keep (and modify) the caller's dict
+        self.devices_to_fastest_per_scene = devices_to_fastest_per_scene
+
+        self.devices: List[Device] = list(devices_to_fastest_per_scene)
+        self.device_indices: Dict[Device, int] = {}
+        self.removed: List[bool] = [False] * len(self.devices)
+
+        # Per scene, (device index, position among that device's scenes) for
+        # all devices having the scene. The smallest one that isn't removed
+        # tells where the scene would come first when iterating over the
+        # devices' scenes.
+        self.scene_positions: Dict[str, List[Tuple[int, int]]] = {}
+        for device_index, (device, timings) in enumerate(
+            devices_to_fastest_per_scene.items()
+        ):
+            self.device_indices[device] = device_index
+            for position, scene in enumerate(timings):
+                # Appending in increasing order keeps these lists valid heaps
+                self.scene_positions.setdefault(scene, []).append(
+                    (device_index, position)
+                )
+
+        self.scene_counts: Dict[str, int] = {}
+        self.scenes_by_count: Dict[int, Set[str]] = {}
+        # Per scene, indices of the devices lacking it, also a valid heap
+        self.scene_lacking: Dict[str, List[int]] = {}
+        for scene, positions in self.scene_positions.items():
+            count = len(positions)
+            self.scene_counts[scene] = count
+            self.scenes_by_count.setdefault(count, set()).add(scene)
+
+            having = {device_index for device_index, _ in positions}
+            self.scene_lacking[scene] = [
+                device_index
+                for device_index in range(len(self.devices))
+                if device_index not in having
+            ]
+
+        # No incomplete scene is more common than this. Counts only ever go
+        # down, so this can only go down too.
+        self.max_incomplete_count = len(self.devices) - 1
+
+    def common_scenes_count(self) -> int:
+        """
+        How many scenes all remaining devices have timings for.
+        """
+        return len(self.scenes_by_count.get(len(self.devices_to_fastest_per_scene), ()))
+
+    def _first_position(self, scene: str) -> Tuple[int, int]:
+        positions = self.scene_positions[scene]
+        while self.removed[positions[0][0]]:
+            heapq.heappop(positions)
+        return positions[0]
+
+    def most_common_incomplete_scene(self) -> Optional[str]:
+        """
+        The scene most remaining devices, but not all of them, have timings for.
+
+        On ties, the scene that would come last when iterating over the devices'
+        scenes wins. That's what we got back when we sorted all scenes by count,
+        and it keeps the results stable.
+        """
+        self.max_incomplete_count = min(
+            self.max_incomplete_count, len(self.devices_to_fastest_per_scene) - 1
+        )
+        while self.max_incomplete_count > 0:
+            scenes = self.scenes_by_count.get(self.max_incomplete_count)
+            if scenes:
+                return max(scenes, key=self._first_position)
+            self.max_incomplete_count -= 1
+        return None
+
+    def first_device_lacking(self, scene: str) -> Device:
+        lacking = self.scene_lacking[scene]
+        while lacking and self.removed[lacking[0]]:
+            heapq.heappop(lacking)
+        if not lacking:
+            raise ValueError(f"All devices have timings for {scene}")
+        return self.devices[lacking[0]]
+
+    def remove(self, device: Device) -> None:
+        self.removed[self.device_indices[device]] = True
+        for scene in self.devices_to_fastest_per_scene.pop(device):
+            count = self.scene_counts[scene]
+            self.scenes_by_count[count].discard(scene)
+            self.scene_counts[scene] = count - 1
+            self.scenes_by_count.setdefault(count - 1, set()).add(scene)
+
+
+class RankingError(ValueError):
+    """
+    Raised when the devices can't be ranked, like when no two of them have
+    enough scenes in common.
+    """
+
+
+def get_greedy_drops(
+    devices_to_fastest_per_scene: Dict[Device, Dict[str, float]], min_count: int
+) -> Tuple[List[Tuple[Device, str]], bool]:
+    """
+    Figure out which devices censor_uncommon_devices() would drop, without
+    modifying the dict.
+
+    Returns the devices to drop in order, each with the scene it lacks, and
+    whether the remaining devices end up with min_count scenes in common.
+    """
+    remaining = dict(devices_to_fastest_per_scene)
+    coverage = SceneCoverage(remaining)
+    drops: List[Tuple[Device, str]] = []
+    while True:
+        if len(remaining) <= 1:
+            return drops, False
+
+        if coverage.common_scenes_count() >= min_count:
+            return drops, True
+
+        # Find the most common scene, ignoring the ones everybody has in common
+        most_common_incomplete_scene = coverage.most_common_incomplete_scene()
+        if most_common_incomplete_scene is None:
+            # All scenes are common already, dropping devices won't add any
+            return drops, False
+
+        # Find a device that doesn't have that most common scene...
+        device = coverage.first_device_lacking(most_common_incomplete_scene)
+
+        # ... and drop it
+        drops.append((device, most_common_incomplete_scene))
+        coverage.remove(device)
+
+
+def censor_uncommon_devices(
+    devices_to_fastest_per_scene: Dict[Device, Dict[str, float]], min_count: int
+) -> List[Tuple[Device, str]]:
+    """
+    For as long as the devices in the dics have less than min_count
+    scenes in common, drop one device at a time.
+
+    This function modifies the dict. Returns the dropped devices in order, each
+    with the scene it lacks. Raises RankingError if no two devices have
+    min_count scenes in common.
+
+    The scene to drop is picked like this:
+    * Find the most common scenes among the devices
+    * Ignore the scenes that all devices have in common
+    * From the rest, find the most common scene
+    * Drop one device that does not have that most common scene
+    """
+    drops, success = get_greedy_drops(devices_to_fastest_per_scene, min_count)
+    if not success:
+        raise RankingError(
+            f"Unable to find any set of devices with {min_count} scenes in common"
+        )
+
+    for device, _ in drops:
+        del devices_to_fastest_per_scene[device]
+    return drops
+
+
+def _popcount_fallback(mask: int) -> int:
+    return bin(mask).count("1")
+
+
+# Much quicker on big masks, but only in Python 3.10 and up
+popcount: Callable[[int], int] = (
+    int.bit_count if hasattr(int, "bit_count") else _popcount_fallback
+)
+
+
+def iterate_bits(mask: int) -> Iterator[int]:
+    """
+    Indices of the set bits in mask, lowest first.
+    """
+    while mask:
+        low_bit = mask & -mask
+        yield low_bit.bit_length() - 1
+        mask ^= low_bit
+
+
+class SearchBudgetExceeded(Exception):
+    pass
+
+
+def find_best_scene_set(
+    scene_masks: List[int], min_count: int, max_nodes: int
+) -> Tuple[int, bool]:
+    """
+    Pick min_count scenes, maximizing the number of devices having all of them.
+
+    scene_masks has one device bitmask per scene, with the most common scenes
+    first.
+
+    Starts from the best set found by a beam search, then does a
+    branch-and-bound search visiting at most max_nodes nodes for a better one.
+    If that isn't enough, the best set found so far is returned.
+
+    Returns the resulting device bitmask, and whether it's known to be optimal.
+    """
+    all_devices = 0
+    for mask in scene_masks:
+        all_devices |= mask
+
+    # Keep the BEAM_SEARCH_WIDTH best partial scene sets at each step. A good
+    # set to start from lets the search below prune much more.
+    beam: List[Tuple[int, int]] = [(all_devices, -1)]
+    for _ in range(min_count):
+        extended: List[Tuple[int, int]] = []
+        for mask, last_scene_index in beam:
+            for scene_index in range(last_scene_index + 1, len(scene_masks)):
+                extended.append((mask & scene_masks[scene_index], scene_index))
+        extended.sort(key=lambda candidate: popcount(candidate[0]), reverse=True)
+        beam = extended[:BEAM_SEARCH_WIDTH]
+
+    best_mask = 0
+    best_count = 0
+    for mask, _ in beam:
+        if popcount(mask) > best_count:
+            best_mask = mask
+            best_count = popcount(mask)
+    nodes = 0
+
+    def search(scene_indices: List[int], chosen_count: int, mask: int) -> None:
+        nonlocal best_mask, best_count, nodes
+        nodes += 1
+        if nodes > max_nodes:
+            raise SearchBudgetExceeded()
+
+        if chosen_count == min_count:
+            count = popcount(mask)
+            if count > best_count:
+                best_mask = mask
+                best_count = count
+            return
+
+        # Only scenes that would leave us better off than the best so far are
+        # worth trying. Try the ones keeping the most devices first, so that we
+        # find a good set early and can prune more.
+        needed = min_count - chosen_count
+        candidates: List[Tuple[int, int, int]] = []
+        for scene_index in scene_indices:
+            candidate_mask = mask & scene_masks[scene_index]
+            count = popcount(candidate_mask)
+            if count > best_count:
+                candidates.append((count, scene_index, candidate_mask))
+        if len(candidates) < needed:
+            return
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+
+        # Picking candidate i and needed - 1 more after it, we end up with
+        # devices that are in at least needed of candidates i and up. Count
+        # those for every i, from the end, with bit-sliced counters:
+        # at_least[t] has the devices in at least t of the candidates so far.
+        upper_bounds = [0] * len(candidates)
+        at_least = [mask] + [0] * needed
+        for i in range(len(candidates) - 1, -1, -1):
+            candidate_mask = candidates[i][2]
+            for seen in range(needed, 0, -1):
+                at_least[seen] |= at_least[seen - 1] & candidate_mask
+            upper_bounds[i] = popcount(at_least[needed])
+
+        for i, (_, _, candidate_mask) in enumerate(candidates):
+            # The bounds only go down from here
+            if len(candidates) - i < needed or upper_bounds[i] <= best_count:
+                break
+            search(
+                [scene_index for _, scene_index, _ in candidates[i + 1 :]],
+                chosen_count + 1,
+                candidate_mask,
+            )
+
+    try:
+        search(list(range(len(scene_masks))), 0, all_devices)
+        return best_mask, True
+    except SearchBudgetExceeded:
+        return best_mask, False
+
+
+def censor_uncommon_devices_optimally(
+    devices_to_fastest_per_scene: Dict[Device, Dict[str, float]], min_count: int
+) -> Tuple[List[Tuple[Device, str]], bool, int]:
+    """
+    Like censor_uncommon_devices(), but keeps the largest possible set of
+    devices with min_count scenes in common, rather than dropping devices
+    greedily.
+
+    This function modifies the dict. Returns the dropped devices, whether the
+    set kept is known to be the largest one, and how many devices
+    censor_uncommon_devices() would have kept.
+    """
+    devices = list(devices_to_fastest_per_scene)
+
+    # Most common scenes first, that's where the big device sets are
+    scene_counts = get_scene_counts(devices_to_fastest_per_scene)
+    scenes = sorted(scene_counts.keys(), key=scene_counts.get, reverse=True)
+    scene_indices = {scene: index for index, scene in enumerate(scenes)}
+
+    # One bitmask of scenes per device...
+    device_scene_masks: List[int] = []
+    for device in devices:
+        device_scene_mask = 0
+        for scene in devices_to_fastest_per_scene[device]:
+            device_scene_mask |= 1 << scene_indices[scene]
+        device_scene_masks.append(device_scene_mask)
+
+    # ... and one bitmask of devices per scene
+    scene_masks = [0] * len(scenes)
+    for device_index, device_scene_mask in enumerate(device_scene_masks):
+        for scene_index in range(len(scenes)):
+            if device_scene_mask & (1 << scene_index):
+                scene_masks[scene_index] |= 1 << device_index
+
+    kept_mask = 0
+    exact = True
+    if len(scenes) >= min_count:
+        kept_mask, exact = find_best_scene_set(
+            scene_masks, min_count, OPTIMAL_SEARCH_MAX_NODES
+        )
+
+    kept_count = popcount(kept_mask)
+    if kept_count <= 1:
+        raise RankingError(
+            f"Unable to find any set of devices with {min_count} scenes in common"
+        )
+
+    greedy_drops, greedy_success = get_greedy_drops(devices_to_fastest_per_scene, min_count)
+    greedy_count = len(devices) - len(greedy_drops) if greedy_success else 0
+
+    common_scenes_mask = -1
+    for device_index, device in enumerate(devices):
+        if kept_mask & (1 << device_index):
+            common_scenes_mask &= device_scene_masks[device_index]
+
+    drops: List[Tuple[Device, str]] = []
+    for device_index, device in enumerate(devices):
+        if kept_mask & (1 << device_index):
+            continue
+        lacking_mask = common_scenes_mask & ~device_scene_masks[device_index]
+        lacking_scene = scenes[(lacking_mask & -lacking_mask).bit_length() - 1]
+        drops.append((device, lacking_scene))
+        del devices_to_fastest_per_scene[device]
+    return drops, exact, greedy_count
+
+
+def get_log_times(
+    devices_to_fastest_per_scene: Dict[Device, Dict[str, float]], scenes: List[str]
+) -> List[List[float]]:
+    """
+    Build a device by scene matrix of log render times, rows in dict order.
+
+    Working with logs, a geometric mean is just an arithmetic mean, and it can't
+    overflow or underflow however many scenes or extreme timings we have.
+    """
+    return [
+        [math.log(timings[scene]) for scene in scenes]
+        for timings in devices_to_fastest_per_scene.values()
+    ]
+
+
+def score_geometric_mean(log_times: List[List[float]]) -> List[float]:
+    return [math.exp(math.fsum(row) / len(row)) for row in log_times]
+
+
+def score_median(log_times: List[List[float]]) -> List[float]:
+    return [math.exp(statistics.median(row)) for row in log_times]
+
+
+def score_trimmed_mean(log_times: List[List[float]]) -> List[float]:
+    scores: List[float] = []
+    for row in log_times:
+        trim_count = int(len(row) * TRIMMED_MEAN_FRACTION)
+        kept = sorted(row)[trim_count : len(row) - trim_count]
+        scores.append(math.exp(math.fsum(kept) / len(kept)))
+    return scores
+
+
+def score_rank(log_times: List[List[float]]) -> List[float]:
+    """
+    Rank devices per scene, 0.0 for the fastest and 1.0 for the slowest device,
+    and average the ranks per device.
+
+    Unlike the other scores this doesn't care about how much faster a device is,
+    so one extreme scene can't dominate.
+    """
+    device_count = len(log_times)
+    scene_count = len(log_times[0]) if log_times else 0
+    rank_sums = [0.0] * device_count
+    for scene_index in range(scene_count):
+        column = [row[scene_index] for row in log_times]
+        order = sorted(range(device_count), key=column.__getitem__)
+
+        # Tied devices share the average of their ranks
+        start = 0
+        while start < device_count:
+            end = start + 1
+            while end < device_count and column[order[end]] == column[order[start]]:
+                end += 1
+            rank = (start + end - 1) / 2 / max(device_count - 1, 1)
+            for device_index in order[start:end]:
+                rank_sums[device_index] += rank
+            start = end
+
+    return [rank_sum / scene_count for rank_sum in rank_sums]
+
+
+# Scorers for --scorer, taking the matrix from get_log_times() and returning one
+# score per device, lower is better
+SCORERS: Dict[str, Callable[[List[List[float]]], List[float]]] = {
+    "geometric-mean": score_geometric_mean,
+    "median": score_median,
+    "trimmed-mean": score_trimmed_mean,
+    "rank": score_rank,
+}
+
+
+# Scorers whose scores aren't durations in seconds
+UNITLESS_SCORERS = {"rank"}
+
+
+def seconds_to_string(seconds: float) -> str:
+    seconds_count = int(seconds) % 60
+    minutes_count = (int(seconds) // 60) % 60
+    hours_count = int(seconds) // 3600
+    if hours_count > 0:
+        return f"{hours_count:2d}h{minutes_count:02d}m"
+    return f"{minutes_count:2d}m{seconds_count:02d}s"
+
+
+def to_duration_description(seconds: float, threads: int) -> str:
+    result = seconds_to_string(seconds)
+    if threads > 0:
+        single_core_duration = seconds_to_string(seconds * threads)
+        result += f" (single threaded: {single_core_duration})"
+    else:
+        result += "                          "
+
+    return result
+
+
+class DownloadError(Exception):
+    """
+    A downloaded database was incomplete or broken.
+    """
+
+
+def read_download_state(filename: str) -> Dict:
+    try:
+        with open(filename + DOWNLOAD_STATE_SUFFIX) as state_file:
+            return json.load(state_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_download_state(filename: str, state: Dict) -> None:
+    state_filename = filename + DOWNLOAD_STATE_SUFFIX
+    temporary_filename = state_filename + ".tmp"
+    with open(temporary_filename, "w") as state_file:
+        json.dump(state, state_file)
+    os.replace(temporary_filename, state_filename)
+
+
+def get_validators(headers: Any) -> Dict[str, str]:
+    validators: Dict[str, str] = {}
+    if headers.get("ETag"):
+        validators["etag"] = headers["ETag"]
+    if headers.get("Last-Modified"):
+        validators["last_modified"] = headers["Last-Modified"]
+    return validators
+
+
+def download_database(url: str, filename: str, expected_sha256: Optional[str]) -> bool:
+    """
+    Download url into filename, unless filename is already up to date.
+
+    The download goes into a .part file which is renamed into place when
+    complete, so filename is never half written. An interrupted download is
+    resumed on the next call if the server supports ranges and the file on the
+    server hasn't changed.
+
+    The result is verified against the expected size, against expected_sha256
+    if set, and against being a zip file at all. If that fails, DownloadError
+    is raised and filename is left alone.
+
+    Returns True if a new file was downloaded, False if the server said ours
+    is still current.
+    """
+    partial_filename = filename + ".part"
+    state = read_download_state(filename)
+
+    headers: Dict[str, str] = {}
+    offset = 0
+    partial_validators: Dict[str, str] = state.get("partial", {})
+    if (
+        os.path.exists(partial_filename)
+        and state.get("partial_url") == url
+        and partial_validators
+    ):
+        # Continue where we left off, but only if the file is still the same
+        offset = os.path.getsize(partial_filename)
+        headers["Range"] = f"bytes={offset}-"
+        headers["If-Range"] = partial_validators.get(
+            "etag", partial_validators.get("last_modified", "")
+        )
+    elif os.path.exists(filename) and state.get("url") == url:
+        if "etag" in state:
+            headers["If-None-Match"] = state["etag"]
+        if "last_modified" in state:
+            headers["If-Modified-Since"] = state["last_modified"]
+
+    try:
+        response = request.urlopen(request.Request(url, headers=headers))
+    except error.HTTPError as e:
+        if e.code == 304:
+            return False
+        if e.code == 416 and "Range" in headers:
+            # Our partial file doesn't fit what's on the server, start over
+            os.remove(partial_filename)
+            return download_database(url, filename, expected_sha256)
+        raise
+
+    with response:
+        if response.status == 206:
+            print(f"Resuming download at {offset // (1024 * 1024)}MB...")
+            mode = "ab"
+        else:
+            offset = 0
+            mode = "wb"
+
+        validators = get_validators(response.headers)
+        expected_size: Optional[int] = None
+        if response.headers.get("Content-Length"):
+            expected_size = offset + int(response.headers["Content-Length"])
+
+        # Remember what we're downloading so that we can resume it
+        state["partial"] = validators
+        state["partial_url"] = url
+        write_download_state(filename, state)
+
+        with open(partial_filename, mode) as partial:
+            try:
+                shutil.copyfileobj(response, partial, 1024 * 1024)
+            except (OSError, HTTPException) as e:
+                # Keep what we got for resuming later
+                raise DownloadError(
+                    f"Download interrupted: {e!r}, run again to resume"
+                ) from e
+
+    size = os.path.getsize(partial_filename)
+    if expected_size is not None and size != expected_size:
+        # Probably cut off, keep the partial file for resuming later
+        raise DownloadError(
+            f"Download incomplete, got {size} bytes out of {expected_size}, run again to resume"
+        )
+
+    if expected_sha256:
+        sha256 = hashlib.sha256()
+        with open(partial_filename, "rb") as partial:
+            for block in iter(lambda: partial.read(1024 * 1024), b""):
+                sha256.update(block)
+        if sha256.hexdigest() != expected_sha256.lower():
+            os.remove(partial_filename)
+            raise DownloadError(
+                f"Downloaded database has SHA-256 {sha256.hexdigest()}, expected {expected_sha256}"
+            )
+
+    if not zipfile.is_zipfile(partial_filename):
+        os.remove(partial_filename)
+        raise DownloadError(f"Downloaded database from {url} is not a zip file")
+
+    os.replace(partial_filename, filename)
+    write_download_state(filename, dict(validators, url=url, checked=time.time()))
+    return True
+
+
+def get_zipfile_name(
+    url: str = DATABASE_URL,
+    max_age_hours: float = DATABASE_MAX_AGE_HOURS,
+    expected_sha256: Optional[str] = None,
+    filename: str = LOCAL_DATABASE_FILENAME,
+    quiet: bool = False,
+) -> str:
+    """
+    Make sure we have a reasonably recent database in filename, and return
+    filename.
+
+    If our database was checked against url less than max_age_hours ago, it's
+    used as is. Otherwise we ask the server for a newer one, which is cheap if
+    there is none. If that fails, we keep using the one we have.
+
+    Raises DownloadError, or urllib's URLError, if we have no database yet and
+    downloading one fails.
+
+    If quiet is set, finding a recent enough database isn't reported, for
+    callers checking again and again. Checking for a newer one still is.
+    """
+    if os.path.exists(filename):
+        state = read_download_state(filename)
+        checked = state.get("checked", os.path.getmtime(filename))
+        age_hours = (time.time() - checked) / 3600
+        if age_hours < max_age_hours:
+            if not quiet:
+                print(f"Database found in {filename}")
+            return filename
+
+        print(
+            f"Database in {filename} was checked {age_hours:.1f}h ago, looking for a newer one..."
+        )
+        try:
+            if download_database(url, filename, expected_sha256):
+                print(f"Downloaded new database into {filename}")
+            else:
+                print("Database is up to date")
+                state["checked"] = time.time()
+                write_download_state(filename, state)
+        except (error.URLError, OSError, DownloadError) as e:
+            print(
+                f"WARNING: Checking for a newer database failed, using the one we have: {e}",
+                file=sys.stderr,
+            )
+        return filename
+
+    print(f'Downloading performance database into "{filename}"...')
+    download_database(url, filename, expected_sha256)
+    return filename
+
+
+def get_cache_key(zip_filename: str) -> Dict:
+    """
+    Identify a database snapshot well enough to know whether a cache built from
+    it is still valid.
+    """
+    stat = os.stat(zip_filename)
+    with zipfile.ZipFile(zip_filename) as opendata:
+        crcs = [
+            entry.CRC
+            for entry in opendata.infolist()
+            if entry.filename.endswith(".jsonl")
+        ]
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "jsonl_crcs": crcs}
+
+
+class HashingReader:
+    """
+    Wraps a binary file, hashing and counting all bytes read through it.
+    """
+
+    def __init__(self, raw: IO[bytes]) -> None:
+        self.raw = raw
+        self.sha256 = hashlib.sha256()
+        self.offset = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.raw.read(size)
+        self.sha256.update(data)
+        self.offset += len(data)
+        return data
+
+    def __iter__(self) -> "HashingReader":
+        return self
+
+    def __next__(self) -> bytes:
+        line = self.raw.readline()
+        if not line:
+            raise StopIteration
+        self.sha256.update(line)
+        self.offset += len(line)
+        return line
+
+
+def skip_parsed_prefix(jsonl: HashingReader, watermark: Dict) -> bool:
+    """
+    Read past the part of jsonl that was already parsed when watermark was
+    taken.
+
+    Returns False if that part has changed since, in which case jsonl is left
+    somewhere in the middle and everything has to be parsed again.
+    """
+    remaining = watermark["offset"]
+    while remaining > 0:
+        block = jsonl.read(min(remaining, 1024 * 1024))
+        if not block:
+            return False
+        remaining -= len(block)
+    return jsonl.sha256.hexdigest() == watermark["sha256"]
+
+
+def parse_jsonl(
+    jsonl: BinaryLines,
+    table: SampleTable,
+    jobs: int,
+    device_matcher: Optional[DeviceMatcher],
+    json_backend: str,
+    schema_stats: Optional[SchemaStats],
+    pipeline: bool,
+) -> int:
+    if jobs > 1:
+        return process_opendata_parallel(
+            jsonl, table, jobs, device_matcher, json_backend, schema_stats, pipeline
+        )
+
+    line_prefilter = None
+    if device_matcher is not None:
+        line_prefilter = device_matcher.get_line_prefilter()
+
+    if not pipeline:
+        # Iterating the zip member yields one line at a time, straight from the
+        # decompressor
+        return process_opendata(
+            jsonl, table, line_prefilter, json_backend, schema_stats
+        )
+
+    # Inflate and split lines in another thread instead
+    batches = read_ahead(
+        (chunk.splitlines() for chunk in iterate_chunks(jsonl, PIPELINE_BLOCK_SIZE)),
+        PIPELINE_QUEUE_DEPTH,
+    )
+    with contextlib.closing(batches):
+        lines = (line for batch in batches for line in batch)
+        return process_opendata(
+            lines, table, line_prefilter, json_backend, schema_stats
+        )
+
+
+def load_samples(
+    zip_filename: str,
+    *,
+    jobs: int = 1,
+    device_matcher: Optional[DeviceMatcher] = None,
+    use_cache: bool = True,
+    json_backend: str = JSON_BACKENDS[0],
+    profiler: Optional[Profiler] = None,
+    cache_filename: Optional[str] = None,
+    pipeline: bool = False,
+    progress: Optional[Callable[[str], None]] = None,
+) -> SampleTable:
+    """
+    Get all samples from the database, from the samples cache if it is up to
+    date, otherwise by parsing the database and updating the cache.
+
+    Snapshots only ever get new lines appended. So if the cache is from an
+    older snapshot, and the beginning of the new snapshot is still the same as
+    all of the old one, only the new lines are parsed and added to the cached
+    samples. The cache remembers how much of the database it covers, and a hash
+    of that part, as its watermark.
+
+    If device_matcher is set, only samples for matching devices are returned.
+    If use_cache is False the cache is bypassed, and only samples for matching
+    devices are parsed. This is faster than building the cache, but the next
+    run will have to parse the database again.
+
+    If jobs is more than one, parsing is done in that many processes. Lines
+    are decoded using json_backend, see get_json_decoder(). If pipeline is
+    set, the database is decompressed in a separate thread, see read_ahead().
+
+    Stages are recorded into profiler if set.
+
+    The cache is kept in cache_filename, by default next to zip_filename.
+
+    What is being done is passed to progress, if set.
+    """
+    if cache_filename is None:
+        cache_filename = zip_filename + SAMPLES_CACHE_SUFFIX
+    if profiler is None:
+        profiler = Profiler()
+    if progress is None:
+        progress = no_progress
+    schema_stats = profiler.schema_stats
+
+    cached: Optional[Tuple[SampleTable, Dict]] = None
+    parse_device_matcher = device_matcher
+    if use_cache:
+        # The cache needs all devices, they are filtered afterwards
+        parse_device_matcher = None
+
+        with profiler.stage("cache read") as stage:
+            cache_key = get_cache_key(zip_filename)
+            cached = SampleTable.read(cache_filename)
+            if cached is not None:
+                stage.items, stage.unit = len(cached[0]), "samples"
+        if cached is not None and cached[1]["key"] == cache_key:
+            table = cached[0]
+            progress(f"Loaded {len(table)} data points from {cache_filename}")
+            if device_matcher is not None:
+                table = table.select_devices(device_matcher)
+            return table
+
+    table = SampleTable(parse_device_matcher)
+    line_count = 0
+    cached_line_count = 0  # Lines parsed by an earlier run
+    watermark: Optional[Dict] = None
+    with profiler.stage("parse") as stage, zipfile.ZipFile(zip_filename) as opendata:
+        entries = [
+            entry for entry in opendata.infolist() if entry.filename.endswith(".jsonl")
+        ]
+        for entry in entries:
+            db_size_mb = entry.file_size // (1024 * 1024)
+
+            # Watermarks only make sense with a single database file
+            previous: Optional[Tuple[SampleTable, Dict]] = None
+            if cached is not None and cached[1].get("watermark") and len(entries) == 1:
+                previous = cached[0], cached[1]["watermark"]
+
+            jsonl: Optional[HashingReader] = None
+            if previous is not None:
+                previous_table, previous_watermark = previous
+                with opendata.open(entry) as raw_jsonl:
+                    jsonl = HashingReader(raw_jsonl)
+                    if skip_parsed_prefix(jsonl, previous_watermark):
+                        table = previous_table
+                        line_count = previous_watermark["lines"]
+                        cached_line_count = line_count
+                        new_mb = (entry.file_size - jsonl.offset) // (1024 * 1024)
+                        progress(
+                            f"Parsing {new_mb}MB added to the {db_size_mb}MB database using {json_backend}..."
+                        )
+                        line_count += parse_jsonl(
+                            jsonl,
+                            table,
+                            jobs,
+                            parse_device_matcher,
+                            json_backend,
+                            schema_stats,
+                            pipeline,
+                        )
+                    else:
+                        # The old part has changed, start over
+                        progress("Database has changed since it was cached")
+                        jsonl = None
+
+            if jsonl is None:
+                with opendata.open(entry) as raw_jsonl:
+                    jsonl = HashingReader(raw_jsonl)
+                    progress(f"Parsing {db_size_mb}MB database using {json_backend}...")
+                    line_count += parse_jsonl(
+                        jsonl,
+                        table,
+                        jobs,
+                        parse_device_matcher,
+                        json_backend,
+                        schema_stats,
+                        pipeline,
+                    )
+
+            if len(entries) == 1:
+                watermark = {
+                    "offset": jsonl.offset,
+                    "sha256": jsonl.sha256.hexdigest(),
+                    "lines": line_count,
+                }
+
+        stage.items, stage.unit = line_count - cached_line_count, "lines"
+
+    if not use_cache:
+        if device_matcher is not None:
+            progress(
+                f"Found {len(table)} data points for the requested devices in {line_count} lines"
+            )
+        else:
+            progress(f"Found {len(table)} data points in {line_count} lines")
+        return table
+
+    progress(
+        f"Found {len(table)} data points in {line_count} lines, at {len(table)/max(line_count, 1):.1f} data points per line"
+    )
+
+    try:
+        with profiler.stage("cache write") as stage:
+            stage.items, stage.unit = len(table), "samples"
+            table.write(cache_filename, cache_key, watermark)
+    except OSError as e:
+        print(f"WARNING: Failed to write {cache_filename}: {e}", file=sys.stderr)
+    else:
+        progress(f"Cached {len(table)} data points in {cache_filename}")
+
+    if device_matcher is not None:
+        table = table.select_devices(device_matcher)
+    return table
+
+
+def aggregate(
+    table: SampleTable,
+    device_filter: Optional[Callable[[str], bool]] = None,
+    registry: Optional[DeviceRegistry] = None,
+    device_rows: Optional[Dict[int, array]] = None,
+    profiler: Optional[Profiler] = None,
+    environment_filter: Optional[Callable[[Environment], bool]] = None,
+    aggregator: str = "fastest",
+    progress: Optional[Callable[[str], None]] = None,
+    environment_rows: Optional[Dict[Tuple[int, int, int], array]] = None,
+) -> Dict[Device, Dict[str, float]]:
+    """
+    Map the devices in table accepted by device_filter to their fastest
+    rendering per scene. All devices are included if device_filter is None.
+
+    See get_fastest_per_scene() for registry, device_rows, environment_filter,
+    aggregator, progress and environment_rows.
+    """
+    if registry is None:
+        registry = DeviceRegistry()
+    if profiler is None:
+        profiler = Profiler()
+
+    device_codes: Optional[Set[int]] = None
+    with profiler.stage("filter") as stage:
+        stage.items, stage.unit = len(table), "samples"
+        if device_filter is not None:
+            device_codes = table.get_device_codes(device_filter)
+
+    # Normalizing is done by get_fastest_per_scene(), but it's cheaper once
+    # the registry has seen the names
+    with profiler.stage("normalize") as stage:
+        for code in set(table.device_name) if device_codes is None else device_codes:
+            registry.canonical_name(table.strings[code])
+        stage.items, stage.unit = len(registry.canonical_names), "names"
+
+    with profiler.stage("aggregate") as stage:
+        stage.items, stage.unit = len(table), "samples"
+        return get_fastest_per_scene(
+            table,
+            device_codes,
+            registry,
+            device_rows,
+            environment_filter,
+            aggregator,
+            progress=progress,
+            environment_rows=environment_rows,
+        )
+
+
+class Ranking(NamedTuple):
+    # The devices left after dropping the ones with too few scenes in common
+    devices_to_fastest_per_scene: Dict[Device, Dict[str, float]]
+
+    common_scenes: List[str]
+
+    # Fastest first. Empty if there are no common scenes.
+    scores: Dict[Device, float]
+
+    scorer: str
+
+    # Devices dropped for lacking timings for a scene, in order, each with
+    # that scene
+    drops: List[Tuple[Device, str]]
+
+    # With the optimal solver, whether the devices kept are known to be the
+    # most possible, and how many dropping devices greedily would have kept
+    exact: bool
+    greedy_count: Optional[int]
+
+
+def rank(
+    devices_to_fastest_per_scene: Dict[Device, Dict[str, float]],
+    min_common_scenes: int = MIN_COMMON_SCENES_COUNT,
+    solver: str = "greedy",
+    scorer: str = "geometric-mean",
+    profiler: Optional[Profiler] = None,
+) -> Ranking:
+    """
+    Drop devices until the rest have at least min_common_scenes scenes in
+    common, then score the remaining ones on those scenes.
+
+    solver is "greedy" or "optimal", see censor_uncommon_devices() and
+    censor_uncommon_devices_optimally(). scorer is one of SCORERS.
+
+    devices_to_fastest_per_scene itself is left alone. Raises RankingError if
+    no two devices have min_common_scenes scenes in common.
+    """
+    if solver not in ("greedy", "optimal"):
+        raise ValueError(f"Unsupported solver: {solver}")
+    if min_common_scenes < 1:
+        raise ValueError(
+            f"min_common_scenes must be at least 1, not {min_common_scenes}"
+        )
+    if scorer not in SCORERS:
+        raise ValueError(f"Unsupported scorer: {scorer}")
+    if profiler is None:
+        profiler = Profiler()
+
+    devices_to_fastest_per_scene = dict(devices_to_fastest_per_scene)
+    exact = True
+    greedy_count: Optional[int] = None
+    with profiler.stage("censor") as stage:
+        stage.items, stage.unit = len(devices_to_fastest_per_scene), "devices"
+        if solver == "optimal":
+            drops, exact, greedy_count = censor_uncommon_devices_optimally(
+                devices_to_fastest_per_scene, min_common_scenes
+            )
+        else:
+            drops = censor_uncommon_devices(
+                devices_to_fastest_per_scene, min_common_scenes
+            )
+
+    # Figure out which common scenes we have
+    common_scenes = set(get_all_scenes(devices_to_fastest_per_scene))
+    for timings in devices_to_fastest_per_scene.values():
+        common_scenes.intersection_update(timings.keys())
+    sorted_common_scenes = sorted(common_scenes)
+
+    devices_to_scores: Dict[Device, float] = {}
+    if devices_to_fastest_per_scene and common_scenes:
+        # For all devices, score the common-scene numbers. By default that's
+        # the geometric mean.
+        with profiler.stage("score") as stage:
+            stage.items, stage.unit = len(devices_to_fastest_per_scene), "devices"
+            log_times = get_log_times(devices_to_fastest_per_scene, sorted_common_scenes)
+            scores = SCORERS[scorer](log_times)
+        devices_to_scores = dict(zip(devices_to_fastest_per_scene.keys(), scores))
+
+    # Rank devices per score
+    top_devices: List[Device] = sorted(
+        list(devices_to_scores.keys()), key=devices_to_scores.get
+    )
+
+    return Ranking(
+        devices_to_fastest_per_scene=devices_to_fastest_per_scene,
+        common_scenes=sorted_common_scenes,
+        scores={device: devices_to_scores[device] for device in top_devices},
+        scorer=scorer,
+        drops=drops,
+        exact=exact,
+        greedy_count=greedy_count,
+    )
+
+
+class PairwiseRanking(NamedTuple):
+    # Fastest first
+    devices: List[Device]
+
+    # Render time relative to the fastest device, same order as devices
+    scores: Dict[Device, float]
+
+    # log_ratios[i][j] is the mean log of devices[i]'s render times over
+    # devices[j]'s, over the shared_counts[i][j] scenes both have timings for.
+    # NaN if there are none. Both are None if there are more than
+    # PAIRWISE_MATRIX_MAX_DEVICES devices, get_pairwise_matrix() computes them.
+    log_ratios: Optional[List[List[float]]]
+    shared_counts: Optional[List[List[int]]]
+
+    # Devices left out for sharing no scenes with the ranked ones
+    unconnected: List[Device]
+
+
+def get_scene_log_matrix(
+    devices_to_fastest_per_scene: Dict[Device, Dict[str, float]]
+) -> Tuple[List[str], List[int], List[List[float]]]:
+    """
+    Build a dense device by scene matrix of log render times, rows in dict
+    order, and one scene bitmask per device telling which entries are real.
+    Missing entries are 0.0.
+
+    Returns the scenes, the bitmasks and the matrix.
+    """
+    scenes = sorted(get_all_scenes(devices_to_fastest_per_scene))
+    scene_indices = {scene: index for index, scene in enumerate(scenes)}
+    scene_masks: List[int] = []
+    log_times: List[List[float]] = []
+    for timings in devices_to_fastest_per_scene.values():
+        scene_mask = 0
+        row = [0.0] * len(scenes)
+        for scene, seconds in timings.items():
+            scene_index = scene_indices[scene]
+            scene_mask |= 1 << scene_index
+            row[scene_index] = math.log(seconds)
+        scene_masks.append(scene_mask)
+        log_times.append(row)
+    return scenes, scene_masks, log_times
+
+
+def get_pairwise_log_ratios(
+    scene_masks: List[int], log_times: List[List[float]]
+) -> Tuple[List[List[float]], List[List[int]]]:
+    """
+    For every pair of rows in get_scene_log_matrix() output, the mean log
+    render time ratio over the scenes both rows have, and how many scenes that
+    is. A mean of logs is the log of the geometric mean.
+
+    There are way fewer distinct sets of scenes than devices, so each device's
+    log time sum is computed once per set, summing per scene columns over all
+    sets at once with map(). A pair's ratio is then the difference of the two
+    devices' sums over each other's set, which is also done a whole row at a
+    time with map() rather than per pair of devices.
+    """
+    mask_groups: Dict[int, int] = {}
+    groups = [mask_groups.setdefault(mask, len(mask_groups)) for mask in scene_masks]
+    group_masks = list(mask_groups)
+    scene_count = max(group_masks, default=0).bit_length()
+
+    # presence[scene][group] is 1 if that set of scenes has the scene
+    presence = [[0] * len(group_masks) for _ in range(scene_count)]
+    for group, scene_mask in enumerate(group_masks):
+        for scene_index in iterate_bits(scene_mask):
+            presence[scene_index][group] = 1
+
+    # log_sums[device][group] is the sum of the device's log times over the
+    # scenes it shares with that set of scenes
+    log_sums: List[List[float]] = []
+    for scene_mask, row in zip(scene_masks, log_times):
+        sums = [0.0] * len(group_masks)
+        for scene_index in iterate_bits(scene_mask):
+            sums = list(
+                map(
+                    operator.add,
+                    sums,
+                    map(
+                        operator.mul,
+                        presence[scene_index],
+                        itertools.repeat(row[scene_index]),
+                    ),
+                )
+            )
+        log_sums.append(sums)
+
+    # The same per pair of sets of scenes, for the shared scene count and its
+    # inverse, NaN where there are no shared scenes to average over
+    inverse_counts = [math.nan] + [1.0 / count for count in range(1, scene_count + 1)]
+    group_counts: List[List[int]] = []
+    group_inverse_counts: List[List[float]] = []
+    for scene_mask in group_masks:
+        counts = [0] * len(group_masks)
+        for scene_index in iterate_bits(scene_mask):
+            counts = list(map(operator.add, counts, presence[scene_index]))
+        group_counts.append(counts)
+        group_inverse_counts.append(list(map(inverse_counts.__getitem__, counts)))
+
+    # And the other way around, every device's sum over each set of scenes
+    group_log_sums = list(zip(*log_sums))
+
+    log_ratios: List[List[float]] = []
+    shared_counts: List[List[int]] = []
+    for group, sums in zip(groups, log_sums):
+        log_ratios.append(
+            list(
+                map(
+                    operator.mul,
+                    map(
+                        operator.sub,
+                        map(sums.__getitem__, groups),
+                        group_log_sums[group],
+                    ),
+                    map(group_inverse_counts[group].__getitem__, groups),
+                )
+            )
+        )
+        shared_counts.append(list(map(group_counts[group].__getitem__, groups)))
+    return log_ratios, shared_counts
+
+
+def get_pairwise_matrix(
+    ranking: PairwiseRanking,
+    devices_to_fastest_per_scene: Dict[Device, Dict[str, float]],
+) -> Tuple[List[List[float]], List[List[int]]]:
+    """
+    The log_ratios and shared_counts of a rank_pairwise() ranking, computed
+    from the devices_to_fastest_per_scene it was ranked from if the ranking
+    left them out for being too big. That's quadratic in the number of devices.
+    """
+    if ranking.log_ratios is not None and ranking.shared_counts is not None:
+        return ranking.log_ratios, ranking.shared_counts
+    _, scene_masks, log_times = get_scene_log_matrix(
+        {device: devices_to_fastest_per_scene[device] for device in ranking.devices}
+    )
+    return get_pairwise_log_ratios(scene_masks, log_times)
+
+
+def get_connected_devices(scene_masks: List[int]) -> List[int]:
+    """
+    Indices of the largest group of devices that can be compared to each other,
+    directly or through other devices, by the scenes they share.
+    """
+    # Pairs of the scenes in a group and its device indices
+    groups: List[Tuple[int, List[int]]] = []
+    for device_index, scene_mask in enumerate(scene_masks):
+        merged_mask = scene_mask
+        merged = [device_index]
+        remaining: List[Tuple[int, List[int]]] = []
+        for group_mask, group in groups:
+            if group_mask & scene_mask:
+                merged_mask |= group_mask
+                merged.extend(group)
+            else:
+                remaining.append((group_mask, group))
+        remaining.append((merged_mask, merged))
+        groups = remaining
+
+    # On ties, prefer the group with the device that comes first
+    largest = max(groups, key=lambda group: (len(group[1]), -min(group[1])))[1]
+    return sorted(largest)
+
+
+def solve_pairwise_log_times(
+    scene_masks: List[int], log_times: List[List[float]], device_indices: List[int]
+) -> Dict[int, float]:
+    """
+    Find one log render time per device that best explains all pairwise
+    comparisons: minimize the sum, over all scenes and all pairs of devices
+    having that scene, of (x[i] - x[j] - (log_times[i][s] - log_times[j][s]))^2.
+
+    Only differences are determined, so the result is normalized to the first
+    device having 0.0. The devices must be connected, see
+    get_connected_devices().
+
+    Setting the derivatives to zero gives L x = b, with L the Laplacian of the
+    graph connecting each pair of devices once per shared scene. That's solved
+    by conjugate gradients, keeping the mean of x at 0 so the solution is
+    unique. L is never built: per scene, the sum of x over the devices having it
+    is enough to multiply by L. So an iteration costs as much as there are
+    timings, however many pairs those make, and it takes at most about as many
+    iterations as there are devices.
+
+    Raises RankingError if that doesn't converge.
+    """
+    scene_count = len(log_times[0]) if log_times else 0
+    device_scenes: List[List[int]] = []
+    for device_index in device_indices:
+        scene_mask = scene_masks[device_index]
+        device_scenes.append(
+            [
+                scene_index
+                for scene_index in range(scene_count)
+                if scene_mask & (1 << scene_index)
+            ]
+        )
+    scene_device_counts = [0] * scene_count
+    for scenes in device_scenes:
+        for scene_index in scenes:
+            scene_device_counts[scene_index] += 1
+    weights = [
+        sum(scene_device_counts[scene_index] - 1 for scene_index in scenes)
+        for scenes in device_scenes
+    ]
+
+    def scene_sums(values: List[float]) -> List[float]:
+        sums = [0.0] * scene_count
+        for value, scenes in zip(values, device_scenes):
+            for scene_index in scenes:
+                sums[scene_index] += value
+        return sums
+
+    def laplacian(values: List[float]) -> List[float]:
+        sums = scene_sums(values)
+        return [
+            # The device's own value is in the scene sums too
+            (weight + len(scenes)) * value - math.fsum(sums[index] for index in scenes)
+            for value, weight, scenes in zip(values, weights, device_scenes)
+        ]
+
+    def centered(values: List[float]) -> List[float]:
+        mean = math.fsum(values) / len(values) if values else 0.0
+        return [value - mean for value in values]
+
+    def dot(a: List[float], b: List[float]) -> float:
+        return math.fsum(map(operator.mul, a, b))
+
+    # b has the same shape as L x, with the log times in place of x
+    log_sums = [0.0] * scene_count
+    own_logs: List[float] = []
+    for device_index, scenes in zip(device_indices, device_scenes):
+        row = log_times[device_index]
+        own_logs.append(
+            math.fsum(scene_device_counts[index] * row[index] for index in scenes)
+        )
+        for scene_index in scenes:
+            log_sums[scene_index] += row[scene_index]
+    b = [
+        own_log - math.fsum(log_sums[index] for index in scenes)
+        for own_log, scenes in zip(own_logs, device_scenes)
+    ]
+
+    # Start from each device's mean log time, exact if all scenes are shared
+    x = centered(
+        [
+            math.fsum(log_times[device_index][index] for index in scenes) / len(scenes)
+            for device_index, scenes in zip(device_indices, device_scenes)
+        ]
+    )
+    residual = centered([bi - li for bi, li in zip(b, laplacian(x))])
+    direction = residual
+    residual_norm2 = dot(residual, residual)
+    tolerance2 = PAIRWISE_TOLERANCE**2 * max(dot(b, b), residual_norm2)
+    for _ in range(PAIRWISE_MAX_ITERATIONS_PER_DEVICE * len(device_indices)):
+        if residual_norm2 <= tolerance2:
+            break
+        product = laplacian(direction)
+        curvature = dot(direction, product)
+        if curvature <= 0.0:
+            # Nothing left to improve in the last direction
+            break
+        step = residual_norm2 / curvature
+        x = [xi + step * di for xi, di in zip(x, direction)]
+        residual = centered([ri - step * pi for ri, pi in zip(residual, product)])
+        previous_norm2 = residual_norm2
+        residual_norm2 = dot(residual, residual)
+        direction = [
+            ri + residual_norm2 / previous_norm2 * di
+            for ri, di in zip(residual, direction)
+        ]
+
+    # The residual above is updated step by step, check the real one
+    final_residual = centered([bi - li for bi, li in zip(b, laplacian(x))])
+    if dot(final_residual, final_residual) > 4 * max(tolerance2, residual_norm2):
+        raise RankingError(
+            f"Pairwise ranking of {len(device_indices)} devices didn't converge"
+        )
+
+    offset = x[0] if x else 0.0
+    return {
+        device_index: log - offset for device_index, log in zip(device_indices, x)
+    }
+
+
+def rank_pairwise(
+    devices_to_fastest_per_scene: Dict[Device, Dict[str, float]],
+    profiler: Optional[Profiler] = None,
+) -> PairwiseRanking:
+    """
+    Rank devices by head-to-head comparisons, using all scenes each pair of
+    devices shares rather than only the scenes all devices share. Nothing has to
+    be dropped, except devices sharing no scenes at all with the rest.
+
+    Devices are ordered by solve_pairwise_log_times(). If all devices share the
+    same scenes, that's the same order (and ratios) the geometric-mean scorer
+    gives.
+
+    devices_to_fastest_per_scene itself is left alone.
+    """
+    if profiler is None:
+        profiler = Profiler()
+
+    devices = list(devices_to_fastest_per_scene)
+    with profiler.stage("pairwise") as stage:
+        stage.items, stage.unit = len(devices), "devices"
+        _, scene_masks, log_times = get_scene_log_matrix(devices_to_fastest_per_scene)
+        connected = get_connected_devices(scene_masks) if devices else []
+        relative_log_times = solve_pairwise_log_times(scene_masks, log_times, connected)
+
+        ordered = sorted(connected, key=relative_log_times.__getitem__)
+        log_ratios: Optional[List[List[float]]] = None
+        shared_counts: Optional[List[List[int]]] = None
+        if len(ordered) <= PAIRWISE_MATRIX_MAX_DEVICES:
+            log_ratios, shared_counts = get_pairwise_log_ratios(
+                [scene_masks[index] for index in ordered],
+                [log_times[index] for index in ordered],
+            )
+
+    connected_set = set(connected)
+    fastest_log_time = relative_log_times[ordered[0]] if ordered else 0.0
+    return PairwiseRanking(
+        devices=[devices[index] for index in ordered],
+        scores={
+            devices[index]: math.exp(relative_log_times[index] - fastest_log_time)
+            for index in ordered
+        },
+        log_ratios=log_ratios,
+        shared_counts=shared_counts,
+        unconnected=[
+            device
+            for index, device in enumerate(devices)
+            if index not in connected_set
+        ],
+    )
+
+
+def beta_continued_fraction(a: float, b: float, x: float) -> float:
+    """
+    Continued fraction for regularized_incomplete_beta(), evaluated with the
+    modified Lentz method, see Numerical Recipes 6.4.
+    """
+    tiny = 1e-300
+    c = 1.0
+    d = 1.0 - (a + b) * x / (a + 1)
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    fraction = d
+    for m in range(1, 10_000):
+        for numerator in (
+            m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+            -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1)),
+        ):
+            d = 1.0 + numerator * d
+            d = 1.0 / (d if abs(d) > tiny else tiny)
+            c = 1.0 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            fraction *= c * d
+        if abs(c * d - 1.0) < 1e-15:
+            break
+    return fraction
+
+
+def regularized_incomplete_beta(a: float, b: float, x: float) -> float:
+    """
+    The CDF of the Beta(a, b) distribution at x.
+    """
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+    log_front = (
+        math.lgamma(a + b)
+        - math.lgamma(a)
+        - math.lgamma(b)
+        + a * math.log(x)
+        + b * math.log1p(-x)
+    )
+
+    # The continued fraction converges quickly on this side only
+    if x < (a + 1) / (a + b + 2):
+        return math.exp(log_front) * beta_continued_fraction(a, b, x) / a
+    return 1.0 - math.exp(log_front) * beta_continued_fraction(b, a, 1.0 - x) / b
+
+
+def get_bootstrap_index_table(count: int, order_statistic: int) -> array:
+    """
+    Map BOOTSTRAP_RANDOM_BITS random bits to which of count sorted samples is
+    the order_statistic'th smallest (from 0) of count samples drawn from them
+    with replacement.
+
+    That's the inverse of its CDF: the k smallest samples contain the
+    order_statistic'th smallest draw if at least order_statistic + 1 of the
+    draws fall among them, and how many do is Binomial(count, k / count)
+    distributed. So we get a bootstrap resample's aggregate in one lookup,
+    without drawing count samples.
+    """
+    size = 1 << BOOTSTRAP_RANDOM_BITS
+    a = order_statistic + 1
+    b = count - order_statistic
+
+    def get_boundary(k: int) -> int:
+        # How many table entries map to one of the k smallest samples
+        return round(size * regularized_incomplete_beta(a, b, k / count))
+
+    # Outside of a narrow range of k, the CDF rounds to 0 or to size. Find that
+    # range by bisection, as count can be big.
+    def get_first(target: int) -> int:
+        low, high = 1, count
+        while low < high:
+            middle = (low + high) // 2
+            if get_boundary(middle) >= target:
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    first = get_first(1)
+    last = get_first(size)
+
+    # Indices past 65535 don't fit in an "H" array
+    table = array("H" if count <= 0xFFFF else "I")
+    previous_boundary = 0
+    for k in range(first, last + 1):
+        boundary = size if k == last else get_boundary(k)
+        table.extend(array(table.typecode, [k - 1]) * (boundary - previous_boundary))
+        previous_boundary = boundary
+    return table
+
+
+class DeviceConfidence(NamedTuple):
+    # Bounds of the confidence interval of the score
+    low: float
+    high: float
+
+    # 1 for the fastest device, and the bounds of its confidence interval
+    rank: int
+    rank_low: int
+    rank_high: int
+
+    # Fraction of resamples with the device at rank
+    rank_stability: float
+
+    # Fraction of resamples with the device faster than the next one in the
+    # ranking, None for the slowest device
+    faster_than_next: Optional[float]
+
+
+def bootstrap_ranking(
+    ranking: Ranking,
+    devices_to_samples_per_scene: Dict[Device, Dict[str, List[float]]],
+    aggregator: str = "fastest",
+    replicates: int = BOOTSTRAP_REPLICATES,
+    level: float = 0.95,
+    seed: Optional[int] = None,
+    profiler: Optional[Profiler] = None,
+) -> Dict[Device, DeviceConfidence]:
+    """
+    Estimate how certain the scores and ranks in ranking are, by recomputing
+    them for replicates resamples of the data.
+
+    Each resample draws the common scenes with replacement, and the samples of
+    each device and scene with replacement, summarizing them with aggregator.
+    devices_to_samples_per_scene comes from get_samples_per_scene(). Only the
+    geometric-mean scorer is supported.
+
+    All work is done on one array per device and scene holding a value for
+    each resample, with map() over those, rather than in Python loops over
+    resamples. Drawing samples is a lookup in get_bootstrap_index_table().
+    """
+    if ranking.scorer != "geometric-mean":
+        raise ValueError(f"Can't bootstrap the {ranking.scorer} scorer")
+    if aggregator not in AGGREGATORS:
+        raise ValueError(f"Unsupported aggregator: {aggregator}")
+    if not 0.0 < level < 1.0:
+        raise ValueError(f"Confidence level must be between 0 and 1: {level}")
+    if replicates < 1:
+        raise ValueError(f"Need at least one replicate: {replicates}")
+    if profiler is None:
+        profiler = Profiler()
+    if not ranking.scores or not ranking.common_scenes:
+        return {}
+
+    random_generator = random.Random(seed)
+    scenes = ranking.common_scenes
+    devices = list(ranking.scores)
+
+    with profiler.stage("bootstrap") as stage:
+        stage.items, stage.unit = len(devices) * replicates, "device resamples"
+
+        # How many times each scene was drawn, per resample. Lists of floats
+        # are quicker to map() over than arrays, which box every item.
+        scene_weights = [[0.0] * replicates for _ in scenes]
+        scene_draws = random_generator.choices(
+            range(len(scenes)), k=len(scenes) * replicates
+        )
+        for replicate in range(replicates):
+            for draw in range(len(scenes) * replicate, len(scenes) * (replicate + 1)):
+                scene_weights[scene_draws[draw]][replicate] += 1.0
+
+        index_tables: Dict[Tuple[int, int], array] = {}
+        log_score_columns: List[array] = []
+        for device in devices:
+            samples_per_scene = devices_to_samples_per_scene[device]
+            weighted_sums = [0.0] * replicates
+            for scene, weights in zip(scenes, scene_weights):
+                log_times = [
+                    math.log(render_time_seconds)
+                    for render_time_seconds in samples_per_scene[scene]
+                ]
+                count = len(log_times)
+                if count == 1:
+                    # Every resample is the same
+                    draws: Iterable[float] = itertools.repeat(log_times[0])
+                else:
+                    key = (count, get_order_statistic(aggregator, count))
+                    index_table = index_tables.get(key)
+                    if index_table is None:
+                        index_table = get_bootstrap_index_table(*key)
+                        index_tables[key] = index_table
+                    random_bits = array(
+                        "H",
+                        random_generator.getrandbits(
+                            BOOTSTRAP_RANDOM_BITS * replicates
+                        ).to_bytes(2 * replicates, "little"),
+                    )
+                    draws = map(
+                        log_times.__getitem__,
+                        map(index_table.__getitem__, random_bits),
+                    )
+                weighted_sums = list(
+                    map(
+                        operator.add,
+                        weighted_sums,
+                        map(operator.mul, weights, draws),
+                    )
+                )
+            log_score_columns.append(array("d", weighted_sums))
+
+        # Per resample, the rank of each device
+        rank_rows: List[array] = []
+        device_indices = range(len(devices))
+        for resample_log_scores in zip(*log_score_columns):
+            order = sorted(device_indices, key=resample_log_scores.__getitem__)
+            rank_rows.append(array("I", sorted(device_indices, key=order.__getitem__)))
+        rank_columns = [array("I", ranks) for ranks in zip(*rank_rows)]
+        del rank_rows
+
+    low_index = int((1.0 - level) / 2 * (replicates - 1))
+    high_index = replicates - 1 - low_index
+    confidences: Dict[Device, DeviceConfidence] = {}
+    for device_index, device in enumerate(devices):
+        log_scores = sorted(log_score_columns[device_index])
+        ranks = sorted(rank_columns[device_index])
+        faster_than_next: Optional[float] = None
+        if device_index + 1 < len(devices):
+            faster_than_next = (
+                sum(
+                    map(
+                        operator.lt,
+                        log_score_columns[device_index],
+                        log_score_columns[device_index + 1],
+                    )
+                )
+                / replicates
+            )
+        confidences[device] = DeviceConfidence(
+            low=math.exp(log_scores[low_index] / len(scenes)),
+            high=math.exp(log_scores[high_index] / len(scenes)),
+            rank=device_index + 1,
+            rank_low=ranks[low_index] + 1,
+            rank_high=ranks[high_index] + 1,
+            rank_stability=ranks.count(device_index) / replicates,
+            faster_than_next=faster_than_next,
+        )
+    return confidences
+
+
+class Snapshot:
+    """
+    All samples from one database snapshot, for answering many ranking queries
+    without parsing the database again for each one.
+
+        snapshot = Snapshot.load(get_zipfile_name())
+        ranking = snapshot.rank(DeviceMatcher(["RTX "]))
+
+    The first filtered query indexes the samples by device, so that later
+    queries only visit the samples of the devices they ask for. Call index()
+    to index them by device and by Environment up front.
+    """
+
+    def __init__(self, table: SampleTable) -> None:
+        self.table = table
+        self.registry = DeviceRegistry()
+        self.device_rows: Optional[Dict[int, array]] = None
+        self.environment_rows: Optional[Dict[Tuple[int, int, int], array]] = None
+
+    @classmethod
+    def load(
+        cls,
+        zip_filename: str,
+        jobs: int = 1,
+        use_cache: bool = True,
+        json_backend: str = JSON_BACKENDS[0],
+        profiler: Optional[Profiler] = None,
+        progress: Optional[Callable[[str], None]] = None,
+    ) -> "Snapshot":
+        """
+        Load all samples from zip_filename, see load_samples().
+        """
+        return cls(
+            load_samples(
+                zip_filename,
+                jobs=jobs,
+                use_cache=use_cache,
+                json_backend=json_backend,
+                profiler=profiler,
+                progress=progress,
+            )
+        )
+
+    def index(self) -> None:
+        """
+        Index the samples by device and by Environment, and register all
+        devices with the registry.
+
+        Queries only read from an indexed snapshot, so several of them can be
+        answered at once.
+        """
+        table = self.table
+        self.device_rows = table.get_device_rows()
+        self.environment_rows = table.get_environment_rows()
+
+        cpu_code = table.string_codes.get("CPU")
+        for device_code, type_code, device_threads in dict.fromkeys(
+            zip(table.device_name, table.device_type, table.device_threads)
+        ):
+            if type_code != cpu_code:
+                # Like get_fastest_per_scene() does
+                device_threads = 0
+            self.registry.get_device_id(table.strings[device_code], device_threads)
+
+    def aggregate(
+        self,
+        device_filter: Optional[Callable[[str], bool]] = None,
+        profiler: Optional[Profiler] = None,
+        environment_filter: Optional[Callable[[Environment], bool]] = None,
+        aggregator: str = "fastest",
+    ) -> Dict[Device, Dict[str, float]]:
+        """
+        See aggregate().
+        """
+        if device_filter is not None and self.device_rows is None:
+            self.device_rows = self.table.get_device_rows()
+        return aggregate(
+            self.table,
+            device_filter,
+            self.registry,
+            self.device_rows,
+            profiler,
+            environment_filter,
+            aggregator,
+            environment_rows=self.environment_rows,
+        )
+
+    def rank(
+        self,
+        device_filter: Optional[Callable[[str], bool]] = None,
+        min_common_scenes: int = MIN_COMMON_SCENES_COUNT,
+        solver: str = "greedy",
+        scorer: str = "geometric-mean",
+        profiler: Optional[Profiler] = None,
+        environment_filter: Optional[Callable[[Environment], bool]] = None,
+        aggregator: str = "fastest",
+    ) -> Ranking:
+        """
+        See rank().
+        """
+        return rank(
+            self.aggregate(device_filter, profiler, environment_filter, aggregator),
+            min_common_scenes,
+            solver,
+            scorer,
+            profiler,
+        )
+
+
+PARTIAL_AGGREGATE_FORMAT = "opendata-partial v1"
+
+
+class PartialAggregate:
+    """
+    Aggregated samples from part of a database, that can be merged with the
+    aggregates of other parts.
+
+    Merging is associative, so parts can be processed on different machines
+    and merged in any grouping. As long as they are merged in database order,
+    the merged result ranks exactly like aggregating the whole database at
+    once would.
+    """
+
+    def __init__(self, aggregator: str = "fastest") -> None:
+        if aggregator not in AGGREGATORS:
+            raise ValueError(f"Unsupported aggregator: {aggregator}")
+        self.aggregator = aggregator
+
+        # Devices and scenes in the order they were first seen, mapping to
+        # aggregator states, see get_fastest_per_scene(with_states=True)
+        self.states: Dict[Device, Dict[str, Any]] = {}
+
+        # What went into this aggregate
+        self.line_count = 0
+        self.sample_count = 0
+        self.byte_ranges: List[Tuple[int, Optional[int]]] = []
+
+    @classmethod
+    def from_table(
+        cls,
+        table: SampleTable,
+        device_filter: Optional[Callable[[str], bool]] = None,
+        aggregator: str = "fastest",
+        line_count: int = 0,
+    ) -> "PartialAggregate":
+        partial = cls(aggregator)
+        device_codes: Optional[Set[int]] = None
+        if device_filter is not None:
+            device_codes = table.get_device_codes(device_filter)
+        partial.states = get_fastest_per_scene(
+            table, device_codes, aggregator=aggregator, with_states=True
+        )
+        partial.line_count = line_count
+        partial.sample_count = len(table)
+        return partial
+
+    def merge(self, other: "PartialAggregate") -> None:
+        """
+        Add other to this aggregate. other is assumed to come after this one
+        in the database.
+        """
+        if other.aggregator != self.aggregator:
+            raise ValueError(
+                f"Can't merge {other.aggregator} aggregates into {self.aggregator} ones"
+            )
+        create_state = AGGREGATORS[self.aggregator]
+
+        for device, other_scenes in other.states.items():
+            scenes = self.states.setdefault(device, {})
+            for scene_name, other_state in other_scenes.items():
+                state = scenes.get(scene_name)
+                if state is None:
+                    if create_state is not None:
+                        # Don't share state objects between aggregates
+                        state = create_state()
+                        state.merge(other_state)
+                        other_state = state
+                    scenes[scene_name] = other_state
+                elif create_state is not None:
+                    state.merge(other_state)
+                elif other_state < state:
+                    scenes[scene_name] = other_state
+
+        self.line_count += other.line_count
+        self.sample_count += other.sample_count
+        self.byte_ranges.extend(other.byte_ranges)
+
+    def get_fastest_per_scene(self) -> Dict[Device, Dict[str, float]]:
+        """
+        The aggregated results, for rank().
+        """
+        create_state = AGGREGATORS[self.aggregator]
+        return {
+            device: {
+                scene_name: state if create_state is None else state.result()
+                for scene_name, state in scenes.items()
+            }
+            for device, scenes in self.states.items()
+        }
+
+    def to_json(self) -> Dict[str, Any]:
+        create_state = AGGREGATORS[self.aggregator]
+        return {
+            "format": PARTIAL_AGGREGATE_FORMAT,
+            "aggregator": self.aggregator,
+            "lines": self.line_count,
+            "samples": self.sample_count,
+            "byte_ranges": self.byte_ranges,
+            "devices": [
+                {
+                    "name": device.name,
+                    "threads": device.threads,
+                    "scenes": {
+                        scene_name: state if create_state is None else state.to_json()
+                        for scene_name, state in scenes.items()
+                    },
+                }
+                for device, scenes in self.states.items()
+            ],
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "PartialAggregate":
+        if data.get("format") != PARTIAL_AGGREGATE_FORMAT:
+            raise ValueError(f"Not a {PARTIAL_AGGREGATE_FORMAT} partial aggregate")
+        partial = cls(data["aggregator"])
+        create_state = AGGREGATORS[partial.aggregator]
+        for device_data in data["devices"]:
+            scenes: Dict[str, Any] = {}
+            for scene_name, state_data in device_data["scenes"].items():
+                state = state_data
+                if create_state is not None:
+                    state = create_state()
+                    state.load_json(state_data)
+                scenes[scene_name] = state
+
+            # Merge into any device differing only in case, like Device does
+            device_partial = cls(partial.aggregator)
+            device_partial.states = {
+                Device.get(device_data["name"], device_data["threads"]): scenes
+            }
+            partial.merge(device_partial)
+
+        partial.line_count = data["lines"]
+        partial.sample_count = data["samples"]
+        partial.byte_ranges = [(start, end) for start, end in data["byte_ranges"]]
+        return partial
+
+    def write(self, filename: str) -> None:
+        temporary_filename = filename + ".tmp"
+        with open(temporary_filename, "w") as partial_file:
+            json.dump(self.to_json(), partial_file)
+        os.replace(temporary_filename, filename)
+
+    @classmethod
+    def read(cls, filename: str) -> "PartialAggregate":
+        try:
+            with open(filename) as partial_file:
+                data = json.load(partial_file)
+        except (OSError, ValueError) as e:
+            raise DatabaseError(f"Can't read partial aggregate {filename}: {e}") from e
+        try:
+            return cls.from_json(data)
+        except (KeyError, TypeError, AttributeError) as e:
+            raise DatabaseError(f"Broken partial aggregate {filename}: {e!r}") from e
+
+
+def read_line_range(
+    jsonl: IO[bytes], start: int, end: Optional[int]
+) -> Iterator[bytes]:
+    """
+    Yield the lines of jsonl that start at or after byte start, and before
+    byte end. Lines crossing end are included whole. If end is None, read to
+    the end of the file.
+
+    Splitting a file into adjacent ranges like this yields each line exactly
+    once.
+    """
+    position = start
+    if start > 0:
+        # If the previous byte is a line break, a line starts right at start.
+        # Otherwise skip the rest of the line we landed in, the previous range
+        # owns it.
+        jsonl.seek(start - 1)
+        position = start - 1 + len(jsonl.readline())
+
+    while end is None or position < end:
+        line = jsonl.readline()
+        if not line:
+            break
+        position += len(line)
+        yield line
+
+
+def map_byte_range(
+    filename: str,
+    start: int,
+    end: Optional[int],
+    device_matcher: Optional[DeviceMatcher] = None,
+    aggregator: str = "fastest",
+    json_backend: str = JSON_BACKENDS[0],
+) -> PartialAggregate:
+    """
+    Aggregate the lines starting in bytes start to end of the decompressed
+    JSONL in filename, see read_line_range().
+
+    filename is either a zipped database, in which case its only .jsonl member
+    is used, or a plain JSONL file. Seeking in a zip member means decompressing
+    up to that point, so shards of plain JSONL files are quicker to get to.
+    """
+    table = SampleTable(device_matcher)
+    line_prefilter = None
+    if device_matcher is not None:
+        line_prefilter = device_matcher.get_line_prefilter()
+
+    with contextlib.ExitStack() as stack:
+        jsonl: IO[bytes]
+        if zipfile.is_zipfile(filename):
+            opendata = stack.enter_context(zipfile.ZipFile(filename))
+            entries = [
+                entry
+                for entry in opendata.infolist()
+                if entry.filename.endswith(".jsonl")
+            ]
+            if len(entries) != 1:
+                raise ValueError(
+                    f"Expected one .jsonl file in {filename}, found {len(entries)}"
+                )
+            jsonl = stack.enter_context(opendata.open(entries[0]))
+        else:
+            jsonl = stack.enter_context(open(filename, "rb"))
+
+        line_count = process_opendata(
+            read_line_range(jsonl, start, end), table, line_prefilter, json_backend
+        )
+
+    partial = PartialAggregate.from_table(table, device_matcher, aggregator, line_count)
+    partial.byte_ranges = [(start, end)]
+    return partial
+
+
+def reduce_partials(partials: Iterable[PartialAggregate]) -> PartialAggregate:
+    """
+    Merge partial aggregates.
+
+    The merge itself is order-independent, but devices and scenes keep the order
+    they were first seen in, and censoring breaks ties by that order. Sorting by
+    byte range restores database order so the ranking matches a single pass.
+    """
+    merged: Optional[PartialAggregate] = None
+    for partial in sorted(
+        partials, key=lambda partial: min(partial.byte_ranges, default=(0, None))[0]
+    ):
+        if merged is None:
+            merged = PartialAggregate(partial.aggregator)
+        merged.merge(partial)
+    if merged is None:
+        raise ValueError("No partial aggregates to reduce")
+    return merged
+
+
+class EnvironmentMatcher:
+    """
+    Accepts Environments matching any of the given Blender versions, any of the
+    given operating systems, and any of the given scenes. Empty lists match
+    everything.
+
+    Versions match by prefix, so "3.6" matches "3.6.2". Everything is case
+    insensitive.
+    """
+
+    def __init__(
+        self, blender_versions: List[str], os_names: List[str], scene_names: List[str]
+    ) -> None:
+        self.blender_versions = tuple(version.lower() for version in blender_versions)
+        self.os_names = {os_name.lower() for os_name in os_names}
+        self.scene_names = {scene_name.lower() for scene_name in scene_names}
+
+    def __call__(self, environment: Environment) -> bool:
+        if self.blender_versions and not environment.blender_version.lower().startswith(
+            self.blender_versions
+        ):
+            return False
+        if self.os_names and environment.os_name.lower() not in self.os_names:
+            return False
+        if self.scene_names and environment.scene_name.lower() not in self.scene_names:
+            return False
+        return True
+
+
+def ranking_to_json(ranking: Ranking) -> Dict[str, Any]:
+    devices: List[Dict[str, Any]] = []
+    for device, score in ranking.scores.items():
+        description = None
+        if ranking.scorer not in UNITLESS_SCORERS:
+            description = to_duration_description(score, device.threads).strip()
+        devices.append(
+            {
+                "name": device.name,
+                "threads": device.threads,
+                "score": score,
+                "description": description,
+            }
+        )
+    return {
+        "scorer": ranking.scorer,
+        "common_scenes": ranking.common_scenes,
+        "devices": devices,
+    }
+
+
+class RankingService:
+    """
+    Answers ranking queries against the latest database snapshot.
+
+    Results are kept in an LRU cache of cache_size entries. A background
+    thread looks for a new snapshot every poll_seconds, and swaps it in once
+    it's loaded. Queries are answered from the old snapshot until then.
+    """
+
+    def __init__(
+        self,
+        get_zipfile: Callable[[], str],
+        jobs: int = 1,
+        json_backend: str = JSON_BACKENDS[0],
+        cache_size: int = QUERY_CACHE_SIZE,
+        poll_seconds: float = SNAPSHOT_POLL_SECONDS,
+    ) -> None:
+        self.get_zipfile = get_zipfile
+        self.jobs = jobs
+        self.json_backend = json_backend
+        self.cache_size = cache_size
+        self.poll_seconds = poll_seconds
+
+        # Guards the cache and swapping snapshots. Queries are answered
+        # without it, from indexed snapshots, see Snapshot.index().
+        self.lock = threading.Lock()
+        self.cache: "collections.OrderedDict[Tuple, Dict[str, Any]]" = (
+            collections.OrderedDict()
+        )
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        self.zip_filename, self.zip_stat = self.find_snapshot()
+        self.snapshot = self.load_snapshot(self.zip_filename)
+        self.loaded = time.time()
+
+    def find_snapshot(self) -> Tuple[str, Tuple[int, int]]:
+        zip_filename = self.get_zipfile()
+        stat = os.stat(zip_filename)
+        return zip_filename, (stat.st_size, stat.st_mtime_ns)
+
+    def load_snapshot(self, zip_filename: str) -> Snapshot:
+        snapshot = Snapshot.load(
+            zip_filename, jobs=self.jobs, json_backend=self.json_backend, progress=print
+        )
+
+        # Index up front rather than in the first query, and so that queries
+        # can run at once
+        snapshot.index()
+        return snapshot
+
+    def reload_if_changed(self) -> bool:
+        """
+        Load and swap in a new snapshot if there is one.
+
+        Returns True if the snapshot was replaced.
+        """
+        zip_filename, zip_stat = self.find_snapshot()
+        if (zip_filename, zip_stat) == (self.zip_filename, self.zip_stat):
+            return False
+
+        print(f"New database snapshot in {zip_filename}, reloading...")
+        snapshot = self.load_snapshot(zip_filename)
+        with self.lock:
+            self.snapshot = snapshot
+            self.zip_filename = zip_filename
+            self.zip_stat = zip_stat
+            self.loaded = time.time()
+            self.cache.clear()
+        print(f"Now serving {len(snapshot.table)} data points from {zip_filename}")
+        return True
+
+    def watch(self) -> None:
+        while True:
+            time.sleep(self.poll_seconds)
+            try:
+                self.reload_if_changed()
+            except Exception:
+                # Keep serving the old snapshot, and try again later
+                traceback.print_exc(file=sys.stderr)
+
+    def start_watching(self) -> None:
+        threading.Thread(target=self.watch, name="snapshot-watcher", daemon=True).start()
+
+    def rank(self, query: Dict[str, List[str]]) -> Dict[str, Any]:
+        """
+        Rank devices as asked for by query, a parsed URL query string.
+
+        Raises ValueError on invalid queries.
+        """
+
+        def get_one(name: str, default: str) -> str:
+            values = query.get(name, [default])
+            if len(values) != 1:
+                raise ValueError(f"Expected one {name} parameter")
+            return values[0]
+
+        patterns = query.get("device", DEVICE_NAMES)
+        if get_one("all_devices", "false").lower() in ("1", "true", "yes"):
+            patterns = []
+        min_common_scenes = int(
+            get_one("min_common_scenes", str(MIN_COMMON_SCENES_COUNT))
+        )
+        solver = get_one("solver", "greedy")
+        scorer = get_one("scorer", "geometric-mean")
+        aggregator = get_one("aggregator", "fastest")
+        blender_versions = query.get("blender_version", [])
+        os_names = query.get("os", [])
+        scene_names = query.get("scene", [])
+
+        key = (
+            tuple(patterns),
+            min_common_scenes,
+            solver,
+            scorer,
+            aggregator,
+            tuple(blender_versions),
+            tuple(os_names),
+            tuple(scene_names),
+        )
+
+        with self.lock:
+            result = self.cache.get(key)
+            if result is not None:
+                self.cache.move_to_end(key)
+                self.cache_hits += 1
+                return result
+            self.cache_misses += 1
+            snapshot = self.snapshot
+            zip_filename = self.zip_filename
+
+        device_matcher: Optional[DeviceMatcher] = None
+        if patterns:
+            try:
+                device_matcher = DeviceMatcher(list(patterns))
+            except re.error as e:
+                raise ValueError(f"Invalid device pattern: {e}") from None
+
+        environment_matcher: Optional[EnvironmentMatcher] = None
+        if blender_versions or os_names or scene_names:
+            environment_matcher = EnvironmentMatcher(
+                blender_versions, os_names, scene_names
+            )
+
+        ranking = snapshot.rank(
+            device_matcher,
+            min_common_scenes,
+            solver=solver,
+            scorer=scorer,
+            environment_filter=environment_matcher,
+            aggregator=aggregator,
+        )
+        result = ranking_to_json(ranking)
+        result["snapshot"] = zip_filename
+
+        with self.lock:
+            # Unless a new snapshot came in meanwhile, and cleared the cache
+            if self.snapshot is snapshot:
+                self.cache[key] = result
+                if len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        return result
+
+    def status(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "snapshot": self.zip_filename,
+                "loaded": self.loaded,
+                "data_points": len(self.snapshot.table),
+                "cached_queries": len(self.cache),
+                "cache_hits": self.cache_hits,
+                "cache_misses": self.cache_misses,
+            }
+
+
+class RankingRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET /rank?device=RTX&device=!Laptop&os=Linux answers with a JSON ranking,
+    see RankingService.rank(). GET /status describes the loaded snapshot.
+    """
+
+    # Set by serve()
+    service: RankingService
+
+    def do_GET(self) -> None:
+        url = parse.urlsplit(self.path)
+        started = time.perf_counter()
+        try:
+            if url.path == "/rank":
+                response = self.service.rank(parse.parse_qs(url.query))
+            elif url.path == "/status":
+                response = self.service.status()
+            else:
+                self.send_json(404, {"error": f"Not found: {url.path}"})
+                return
+        except ValueError as e:
+            self.send_json(400, {"error": str(e)})
+            return
+
+        response = dict(response, milliseconds=(time.perf_counter() - started) * 1000)
+        self.send_json(200, response)
+
+    def send_json(self, status: int, response: Dict[str, Any]) -> None:
+        body = json.dumps(response).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(service: RankingService, host: str, port: int) -> None:
+    RankingRequestHandler.service = service
+    with ThreadingHTTPServer((host, port), RankingRequestHandler) as http_server:
+        service.start_watching()
+        print(f"Serving rankings on http://{host}:{http_server.server_port}/rank")
+        http_server.serve_forever()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Rank Blender render devices using opendata.blender.org benchmark results"
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="parse the database using N processes (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--url",
+        default=DATABASE_URL,
+        help="where to download the database from (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--max-age",
+        type=float,
+        default=DATABASE_MAX_AGE_HOURS,
+        metavar="HOURS",
+        help="check for a newer database if ours was last checked more than HOURS ago (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--sha256",
+        help="verify that a downloaded database has this SHA-256 checksum",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="don't use or update the samples cache, only parse lines mentioning the requested devices",
+    )
+    parser.add_argument(
+        "--solver",
+        choices=["greedy", "optimal"],
+        default="greedy",
+        help="how to pick devices with enough scenes in common: drop one device at a time, or search for the largest set of devices (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--aggregator",
+        choices=list(AGGREGATORS.keys()),
+        default="fastest",
+        help=f"how to summarize the samples for each device and scene: the fastest one, the slowest of the {TOP_K_SAMPLES} fastest, or an estimated median or 10th percentile (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--scorer",
+        choices=list(SCORERS.keys()),
+        default="geometric-mean",
+        help="how to combine each device's common-scene timings into one score (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--pairwise",
+        action="store_true",
+        help="compare each pair of devices on the scenes both have, and rank them by all those comparisons. Unlike the default ranking this doesn't drop devices lacking common scenes. --solver and --scorer are ignored.",
+    )
+    parser.add_argument(
+        "--confidence",
+        nargs="?",
+        const=0.95,
+        type=float,
+        metavar="LEVEL",
+        help="resample the common scenes and the samples per scene to show confidence intervals and how stable each device's rank is (default level: 0.95)",
+    )
+    parser.add_argument(
+        "--replicates",
+        type=int,
+        default=BOOTSTRAP_REPLICATES,
+        metavar="N",
+        help="how many resamples to rank for --confidence (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="decompress the database in a separate thread while parsing it",
+    )
+    parser.add_argument(
+        "--json-backend",
+        choices=JSON_BACKENDS,
+        default=JSON_BACKENDS[0],
+        help="how to decode the database, the default is the fastest one installed (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="table",
+        choices=["table", "json"],
+        help="print time and memory used per stage to stderr, as a table or as JSON (default: table)",
+    )
+    parser.add_argument(
+        "--profile-dump",
+        metavar="FILE",
+        help="write cProfile statistics for the slowest stage to FILE, implies --profile. With --jobs, worker processes are not profiled.",
+    )
+    parser.add_argument(
+        "--map",
+        metavar="START:END",
+        help="aggregate only the lines starting in this byte range of the decompressed database, and write the result to --partial. END may be left out to read to the end.",
+    )
+    parser.add_argument(
+        "--reduce",
+        nargs="+",
+        metavar="PARTIAL",
+        help="merge --map results and rank the devices in them. With --partial, write the merged result there instead.",
+    )
+    parser.add_argument(
+        "--partial",
+        metavar="FILE",
+        help="where to write the result of --map or --reduce",
+    )
+    parser.add_argument(
+        "--serve",
+        type=int,
+        metavar="PORT",
+        help="load the database once, then answer ranking queries over HTTP on PORT",
+    )
+    parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="address to listen on with --serve (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-d",
+        "--device",
+        action="append",
+        metavar="PATTERN",
+        help='rank devices matching PATTERN instead of DEVICE_NAMES, may be repeated. Prefix with "re:" for a regex, or with "!" to exclude matches.',
+    )
+    parser.add_argument(
+        "--all-devices",
+        action="store_true",
+        help="rank all devices in the database, not just the ones in DEVICE_NAMES",
+    )
+    args = parser.parse_args()
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.profile_dump and not args.profile:
+        args.profile = "table"
+    if args.confidence is not None:
+        if not 0.0 < args.confidence < 1.0:
+            parser.error("--confidence must be between 0 and 1")
+        if args.replicates < 1:
+            parser.error("--replicates must be at least 1")
+        if args.scorer != "geometric-mean":
+            parser.error("--confidence only works with --scorer=geometric-mean")
+        if args.pairwise or args.map is not None or args.reduce is not None:
+            parser.error(
+                "--confidence needs all samples, it can't be combined with --pairwise, --map or --reduce"
+            )
+    if args.map is not None and args.reduce is not None:
+        parser.error("--map and --reduce can't be combined")
+    if args.map is not None:
+        if not args.partial:
+            parser.error("--map needs --partial")
+        start, separator, end = args.map.partition(":")
+        try:
+            args.map_start = int(start)
+            args.map_end = int(end) if end else None
+        except ValueError:
+            separator = ""
+        if not separator or args.map_start < 0:
+            parser.error("--map takes a byte range like 0:1000000")
+        if args.map_end is not None and args.map_end < args.map_start:
+            parser.error("--map range ends before it starts")
+    try:
+        args.device_matcher = DeviceMatcher(args.device or DEVICE_NAMES)
+    except re.error as e:
+        parser.error(f"Invalid device pattern: {e}")
+    return args
+
+
+def print_profile(
+    profiler: Profiler, output_format: str, dump_filename: Optional[str]
+) -> None:
+    if output_format == "json":
+        json.dump(profiler.as_dict(), sys.stderr, indent=2)
+        print("", file=sys.stderr)
+    else:
+        print("", file=sys.stderr)
+        profiler.print_table(sys.stderr)
+
+    if dump_filename:
+        hottest = profiler.hottest_stage()
+        if hottest is None or hottest.cprofile is None:
+            return
+        hottest.cprofile.dump_stats(dump_filename)
+        print(
+            f"Wrote cProfile statistics for the {hottest.name} stage to {dump_filename}",
+            file=sys.stderr,
+        )
+
+
+def run(args: argparse.Namespace) -> None:
+    profiler = Profiler(
+        with_schema_stats=args.profile is not None,
+        with_cprofile=args.profile_dump is not None,
+    )
+    if args.map is not None:
+        device_matcher: Optional[DeviceMatcher] = args.device_matcher
+        if args.all_devices:
+            device_matcher = None
+        try:
+            partial = map_byte_range(
+                get_zipfile_name(args.url, args.max_age, args.sha256),
+                args.map_start,
+                args.map_end,
+                device_matcher,
+                args.aggregator,
+                args.json_backend,
+            )
+        except ValueError as e:
+            sys.exit(f"FAILED: {e}")
+        partial.write(args.partial)
+        print(
+            f"Wrote {partial.sample_count} data points from {partial.line_count} lines to {args.partial}"
+        )
+        return
+
+    if args.reduce is not None:
+        try:
+            partial = reduce_partials(
+                PartialAggregate.read(filename) for filename in args.reduce
+            )
+        except ValueError as e:
+            sys.exit(f"FAILED: {e}")
+        print(
+            f"Merged {partial.sample_count} data points from {partial.line_count} lines"
+        )
+        if args.partial:
+            partial.write(args.partial)
+            print(f"Wrote merged aggregate to {args.partial}")
+            return
+        if args.pairwise:
+            print_pairwise_ranking(rank_pairwise(partial.get_fastest_per_scene()))
+            return
+        print_ranking(
+            rank(
+                partial.get_fastest_per_scene(),
+                MIN_COMMON_SCENES_COUNT,
+                solver=args.solver,
+                scorer=args.scorer,
+            )
+        )
+        return
+
+    if args.serve is not None:
+        service = RankingService(
+            # Called again on every poll, see RankingService.watch()
+            lambda: get_zipfile_name(args.url, args.max_age, args.sha256, quiet=True),
+            jobs=args.jobs,
+            json_backend=args.json_backend,
+        )
+        try:
+            serve(service, args.host, args.serve)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    try:
+        rank_devices(args, profiler)
+    finally:
+        if args.profile is not None:
+            print_profile(profiler, args.profile, args.profile_dump)
+
+
+def main() -> None:
+    try:
+        run(parse_args())
+    except (DownloadError, DatabaseError, RankingError) as e:
+        sys.exit(f"FAILED: {e}")
+
+
+def rank_devices(args: argparse.Namespace, profiler: Profiler) -> None:
+    # List samples for all devices we're interested in
+    device_matcher: Optional[DeviceMatcher] = args.device_matcher
+    if args.all_devices:
+        device_matcher = None
+    with profiler.stage("download"):
+        zip_filename = get_zipfile_name(args.url, args.max_age, args.sha256)
+    table = load_samples(
+        zip_filename,
+        jobs=args.jobs,
+        device_matcher=device_matcher,
+        use_cache=not args.no_cache,
+        json_backend=args.json_backend,
+        profiler=profiler,
+        pipeline=args.pipeline,
+        progress=print,
+    )
+
+    if args.confidence is not None:
+        # Keep all samples for resampling them, and summarize them ourselves
+        device_codes: Optional[Set[int]] = None
+        if device_matcher is not None:
+            device_codes = table.get_device_codes(device_matcher)
+        with profiler.stage("aggregate") as stage:
+            stage.items, stage.unit = len(table), "samples"
+            devices_to_samples_per_scene = get_samples_per_scene(
+                table, device_codes, progress=print
+            )
+        devices_to_fastest_per_scene = summarize_samples(
+            devices_to_samples_per_scene, args.aggregator
+        )
+    else:
+        devices_to_fastest_per_scene = aggregate(
+            table,
+            device_matcher,
+            profiler=profiler,
+            aggregator=args.aggregator,
+            progress=print,
+        )
+    if args.pairwise:
+        print_pairwise_ranking(
+            rank_pairwise(devices_to_fastest_per_scene, profiler=profiler)
+        )
+        return
+
+    ranking = rank(
+        devices_to_fastest_per_scene,
+        MIN_COMMON_SCENES_COUNT,
+        solver=args.solver,
+        scorer=args.scorer,
+        profiler=profiler,
+    )
+    confidences: Optional[Dict[Device, DeviceConfidence]] = None
+    if args.confidence is not None:
+        confidences = bootstrap_ranking(
+            ranking,
+            devices_to_samples_per_scene,
+            args.aggregator,
+            replicates=args.replicates,
+            level=args.confidence,
+            profiler=profiler,
+        )
+    print_ranking(ranking, confidences)
+
+
+def print_ranking(
+    ranking: Ranking, confidences: Optional[Dict[Device, DeviceConfidence]] = None
+) -> None:
+    devices_to_fastest_per_scene = ranking.devices_to_fastest_per_scene
+
+    for device, scene in ranking.drops:
+        print(f"Dropping {device} lacking timings for {scene}")
+    if ranking.greedy_count is not None:
+        how = "optimal" if ranking.exact else "best found, search budget exceeded"
+        print(
+            f"Kept {len(devices_to_fastest_per_scene)} devices ({how}), dropping devices greedily would have kept {ranking.greedy_count}"
+        )
+
+    print(
+        f"Found {len(devices_to_fastest_per_scene)} matching devices with {len(ranking.common_scenes)} scenes in common"
+    )
+    if not devices_to_fastest_per_scene:
+        sys.exit("FAILED: No matching devices")
+
+    scene_counts = get_scene_counts(devices_to_fastest_per_scene)
+    top_scenes: List[str] = sorted(
+        scene_counts.keys(), key=scene_counts.get, reverse=True
+    )
+    print("Most common scenes (with counts):")
+    for scene in top_scenes:
+        print(f"{scene_counts[scene]:4d}: {scene}")
+
+    print(
+        f"Matching devices have {len(ranking.common_scenes)}/{len(get_all_scenes(devices_to_fastest_per_scene))} scenes in common"
+    )
+    if not ranking.common_scenes:
+        sys.exit("FAILED: No common scenes")
+
+    print("")
+    print("List of devices, from fastest to slowest")
+    for device, score in ranking.scores.items():
+        if ranking.scorer in UNITLESS_SCORERS:
+            score_string = f"{score:.3f}"
+        else:
+            score_string = to_duration_description(score, device.threads)
+        print(f"{score_string}: {device}")
+
+        if confidences is None:
+            continue
+        confidence = confidences[device]
+        description = (
+            f"{seconds_to_string(confidence.low)} to {seconds_to_string(confidence.high)},"
+            f" rank {confidence.rank_low} to {confidence.rank_high},"
+            f" rank {confidence.rank} in {confidence.rank_stability:.0%} of resamples"
+        )
+        if confidence.faster_than_next is not None:
+            description += (
+                f", faster than the next in {confidence.faster_than_next:.0%}"
+            )
+        print(f"    {description}")
+
+
+def print_pairwise_ranking(ranking: PairwiseRanking) -> None:
+    for device in ranking.unconnected:
+        print(f"Dropping {device} sharing no scenes with the other devices")
+    if not ranking.devices:
+        sys.exit("FAILED: No matching devices")
+    print(f"Found {len(ranking.devices)} matching devices comparable to each other")
+
+    print("")
+    print(
+        "List of devices, from fastest to slowest, with render times relative to the fastest"
+    )
+    for index, (device, score) in enumerate(ranking.scores.items()):
+        print(f"{index + 1:3d}. {score:.3f}: {device}")
+
+    if ranking.log_ratios is None:
+        return
+    print("")
+    print("Render time ratios of row over column device, over the scenes both have")
+    print("    " + "".join(f"{index + 1:7d}" for index in range(len(ranking.devices))))
+    for index, row in enumerate(ranking.log_ratios):
+        cells = [
+            "      -" if math.isnan(log_ratio) else f"{math.exp(log_ratio):7.2f}"
+            for log_ratio in row
+        ]
+        print(f"{index + 1:3d}." + "".join(cells))
 
 
-main()
+if __name__ == "__main__":
+    main()